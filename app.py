@@ -1,12 +1,13 @@
 import streamlit as st
 import time
-from modules.database import init_db
-from modules.auth import login_user, register_user, update_user_profile_full
+from modules import startup
+from modules.database import init_db, clear_query_cache, get_connection
+from modules.change_feed import start_change_listener
+from modules.auth import login_user, register_user, update_user_profile_full, client_ip, login_throttle_remaining, ServerBusy
 from modules.utils import setup_styles, show_footer
 from modules.config import TEXT as txt, AREAS
-from modules.views.warehouse import manager_view_warehouse, storekeeper_view, supervisor_view_warehouse
-from modules.views.manpower import manager_view_manpower, supervisor_view_manpower
-from modules.views.dashboard import manager_dashboard
+# View modules (pandas, plotly, openpyxl) are imported on first use of their route via startup.view
+startup.mark("app imports")
 
 # --- 1. Page Setup & Styling ---
 st.set_page_config(page_title="NSTC Management", layout="wide", initial_sidebar_state="expanded", page_icon="📦")
@@ -32,7 +33,16 @@ def show_login():
             u = st.text_input(txt['username'])
             p = st.text_input(txt['password'], type="password")
             if st.form_submit_button(txt['login_btn'], width="stretch"):
-                user_data = login_user(u.strip(), p.strip())
+                ip = client_ip()
+                wait = login_throttle_remaining(u.strip(), ip)
+                if wait:
+                    st.error(f"Too many failed attempts. Try again in {wait} seconds.")
+                    return
+                try:
+                    user_data = login_user(u.strip(), p.strip(), ip)
+                except ServerBusy:
+                    st.warning(txt['error_busy'])
+                    return
                 if user_data:
                     st.session_state.logged_in = True
                     st.session_state.user_info = user_data
@@ -48,9 +58,13 @@ def show_login():
             if st.form_submit_button(txt['register_btn'], width="stretch"):
                 # Join regions with comma
                 region_str = ",".join(nr)
-                if register_user(nu.strip(), np.strip(), nn, region_str): 
-                    st.success(txt['success_reg']); st.cache_data.clear()
-                else: st.error("Error: Username might exist")
+                try:
+                    registered = register_user(nu.strip(), np.strip(), nn, region_str)
+                except ServerBusy:
+                    st.warning(txt['error_busy'])
+                else:
+                    if registered: st.success(txt['success_reg'])
+                    else: st.error("Error: Username might exist")
 
 def show_main_app():
     info = st.session_state.user_info
@@ -69,7 +83,7 @@ def show_main_app():
         # Add Dashboard for Manager
         options = ["Warehouse", "Manpower"]
         if info.get('role') == 'manager':
-            options = ["Dashboard", "Warehouse", "Manpower"]
+            options = ["Dashboard", "Warehouse", "Manpower", "Performance"]
         
         # Get current index based on stored module
         current_mod = st.session_state.get('active_module', options[0])
@@ -86,7 +100,7 @@ def show_main_app():
     @st.fragment
     def refresh_button():
         if st.button(txt['refresh_data'], width="stretch"):
-            st.cache_data.clear()
+            clear_query_cache()
             st.toast("✅ Data refreshed!", icon="🔄")
             st.rerun(scope="fragment")
     
@@ -110,7 +124,6 @@ def show_main_app():
                     time.sleep(1)
                     st.session_state.logged_in = False
                     st.session_state.user_info = {}
-                    st.cache_data.clear()
                     st.rerun()
                 else: st.error(msg)
         render_profile_editor(info)
@@ -131,25 +144,30 @@ def show_main_app():
         st.session_state.active_module = "Manpower"
     
     if st.session_state.active_module == "Dashboard":
-        manager_dashboard()
+        route = ("modules.views.dashboard", "manager_dashboard")
+    elif st.session_state.active_module == "Performance" and info['role'] == 'manager':
+        route = ("modules.views.performance", "manager_performance")
     elif st.session_state.active_module == "Warehouse":
         if is_night_shift: 
             st.warning("⛔ Access Restricted: Night Shift (B) can only access Manpower module.")
-            supervisor_view_manpower()
-        elif info['role'] == 'manager': manager_view_warehouse()
-        elif info['role'] == 'storekeeper': storekeeper_view()
-        else: supervisor_view_warehouse()
+            route = ("modules.views.manpower", "supervisor_view_manpower")
+        elif info['role'] == 'manager': route = ("modules.views.warehouse", "manager_view_warehouse")
+        elif info['role'] == 'storekeeper': route = ("modules.views.warehouse", "storekeeper_view")
+        else: route = ("modules.views.warehouse", "supervisor_view_warehouse")
     else:
-        if info['role'] == 'manager': manager_view_manpower()
-        elif is_night_shift: supervisor_view_manpower()
-        else: supervisor_view_manpower()
+        if info['role'] == 'manager': route = ("modules.views.manpower", "manager_view_manpower")
+        elif is_night_shift: route = ("modules.views.manpower", "supervisor_view_manpower")
+        else: route = ("modules.views.manpower", "supervisor_view_manpower")
+    startup.render(route[1], startup.view(*route))
     
     st.sidebar.caption("v1.2 - Schema Fix Applied (Check DB)")
     show_footer()
 
 if __name__ == "__main__":
-    init_db() # Ensure tables exist
+    init_db() # Ensure schema is at the latest migration (DDL runs once per process)
+    start_change_listener(get_connection()) # LISTEN/NOTIFY cache invalidation (one thread per process)
     if st.session_state.logged_in:
         show_main_app()
     else:
-        show_login()
+        startup.render("show_login", show_login)
+        startup.prewarm("pandas") # The login submit runs the first query; load pandas while the form is shown
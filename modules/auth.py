@@ -1,12 +1,38 @@
 
 import hashlib
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as PoolTimeout
 import bcrypt
 import streamlit as st
+from modules import perf
 from modules.database import run_query, run_action
 
+DEFAULT_BCRYPT_ROUNDS = 12
+
+def bcrypt_rounds() -> int:
+    """bcrypt cost factor for new hashes ([auth] bcrypt_rounds in secrets)."""
+    try:
+        rounds = int(st.secrets.get("auth", {}).get("bcrypt_rounds", DEFAULT_BCRYPT_ROUNDS))
+    except Exception:
+        rounds = DEFAULT_BCRYPT_ROUNDS
+    return min(max(rounds, 4), 31)
+
 def hash_password(password: str) -> str:
     """Hash password using bcrypt with auto-generated salt (secure for passwords)."""
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=bcrypt_rounds())).decode()
+
+def needs_rehash(stored_password: str) -> bool:
+    """True for legacy (plain text / SHA256) hashes and bcrypt hashes below the configured cost."""
+    if not stored_password.startswith('$2'):
+        return True
+    try:
+        # $2b$12$<salt+hash>
+        return int(stored_password.split('$')[2]) < bcrypt_rounds()
+    except (IndexError, ValueError):
+        return True
 
 def hash_password_sha256(password: str) -> str:
     """Legacy SHA256 hash - for backward compatibility only."""
@@ -35,7 +61,170 @@ def verify_password(stored_password: str, provided_password: str) -> bool:
         
     return False
 
-def login_user(username, password):
+# ---- Password worker pool ----
+# bcrypt releases the GIL, so a small thread pool runs hashes in parallel on separate cores
+# while script threads only wait on a future. The pool is bounded: when QUEUE_LIMIT jobs are
+# already queued or running, new requests are refused instead of queueing behind a burst.
+# A job holds its slot until it finishes, even if the caller stopped waiting for it.
+
+DEFAULT_HASH_WORKERS = min(4, os.cpu_count() or 1)
+DEFAULT_QUEUE_LIMIT = 32
+HASH_TIMEOUT_SECONDS = 30
+
+_pool_lock = threading.Lock()
+_pool = None
+_pending = 0
+POOL_STATS = {"submitted": 0, "completed": 0, "rejected": 0, "timed_out": 0, "max_depth": 0}
+
+class ServerBusy(Exception):
+    """The password pool is saturated or too slow; the request was not judged, so retry later."""
+
+def _auth_settings():
+    try:
+        return st.secrets.get("auth", {})
+    except Exception:
+        return {}
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                workers = int(_auth_settings().get("hash_workers", DEFAULT_HASH_WORKERS))
+                _pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="password-hash")
+    return _pool
+
+def run_password_job(name, fn, *args):
+    """
+    Run a bcrypt call on the worker pool and wait for it.
+    Returns (ok, result); ok is False if the pool is saturated, the wait timed out or the job failed.
+    Queue wait and run time are recorded in perf as kind 'auth'.
+    """
+    global _pending
+    limit = int(_auth_settings().get("queue_limit", DEFAULT_QUEUE_LIMIT))
+    with _pool_lock:
+        if _pending >= limit:
+            POOL_STATS["rejected"] += 1
+            return False, None
+        _pending += 1
+        POOL_STATS["submitted"] += 1
+        POOL_STATS["max_depth"] = max(POOL_STATS["max_depth"], _pending)
+    queued = time.perf_counter()
+    started = []
+
+    def job():
+        started.append(time.perf_counter())
+        return fn(*args)
+
+    def release(_future):
+        global _pending
+        with _pool_lock:
+            _pending -= 1
+            POOL_STATS["completed"] += 1
+
+    try:
+        future = _get_pool().submit(job)
+    except Exception as e:
+        release(None)
+        perf.record("auth", name, time.perf_counter() - queued, error=str(e))
+        return False, None
+    future.add_done_callback(release)
+    try:
+        result = future.result(timeout=HASH_TIMEOUT_SECONDS)
+        ok, error = True, None
+    except PoolTimeout:
+        with _pool_lock:
+            POOL_STATS["timed_out"] += 1
+        result, ok, error = None, False, f"Timed out after {HASH_TIMEOUT_SECONDS}s"
+    except Exception as e:
+        result, ok, error = None, False, str(e)
+    done = time.perf_counter()
+    wait = (started[0] - queued) if started else done - queued
+    perf.record("auth", f"{name} (queue wait)", wait, error=error)
+    perf.record("auth", name, done - queued - wait, error=error)
+    return ok, result
+
+def pool_stats():
+    """Current queue depth plus lifetime counters of the password pool."""
+    with _pool_lock:
+        return dict(POOL_STATS, depth=_pending)
+
+# ---- Login attempt throttle ----
+# Failed attempts are counted per username and per client IP over a sliding window;
+# once a key reaches its limit further attempts are refused before any bcrypt work,
+# so guessing cannot monopolise the pool. The per-IP limit is much higher than the
+# per-user one: a whole site can sit behind one NAT address at shift change.
+# Behind a reverse proxy set [auth] trusted_proxies to the number of proxy hops that
+# append to X-Forwarded-For; without it a forwarded request is throttled per username only.
+
+MAX_FAILED_ATTEMPTS = 5
+MAX_FAILED_ATTEMPTS_PER_IP = 50
+ATTEMPT_WINDOW_SECONDS = 300
+MAX_TRACKED_KEYS = 10000
+
+_throttle_lock = threading.Lock()
+_failures = {}   # "u:<username>" / "ip:<address>" -> deque of failure timestamps
+
+def client_ip():
+    """Client address for throttling, or None when it cannot be trusted."""
+    try:
+        trusted = int(_auth_settings().get("trusted_proxies", 0))
+        forwarded = st.context.headers.get("X-Forwarded-For")
+        if trusted > 0:
+            # Hops are appended left to right; the client cannot forge the ones our proxies added
+            hops = [h.strip() for h in (forwarded or "").split(",") if h.strip()]
+            return hops[-trusted] if len(hops) >= trusted else None
+        if forwarded:
+            # Proxied, but the proxy is not configured as trusted: the peer address is the proxy's
+            return None
+        return getattr(st.context, "ip_address", None)
+    except Exception:
+        return None
+
+def _throttle_keys(username, ip):
+    keys = [(f"u:{username.lower()}", MAX_FAILED_ATTEMPTS)]
+    if ip: keys.append((f"ip:{ip}", MAX_FAILED_ATTEMPTS_PER_IP))
+    return keys
+
+def login_throttle_remaining(username, ip=None):
+    """Seconds until username/ip may try again, or 0 if not throttled."""
+    now = time.time()
+    wait = 0
+    with _throttle_lock:
+        for key, limit in _throttle_keys(username, ip):
+            fails = _failures.get(key)
+            if not fails: continue
+            while fails and fails[0] <= now - ATTEMPT_WINDOW_SECONDS:
+                fails.popleft()
+            if len(fails) >= limit:
+                wait = max(wait, fails[0] + ATTEMPT_WINDOW_SECONDS - now)
+    return int(wait) + 1 if wait else 0
+
+def throttled_count():
+    """Number of usernames/addresses currently locked out."""
+    with _throttle_lock:
+        keys = [k for k, v in _failures.items() if len(v) >= v.maxlen and v[0] > time.time() - ATTEMPT_WINDOW_SECONDS]
+    return len(keys)
+
+def _record_login_result(username, ip, success):
+    now = time.time()
+    with _throttle_lock:
+        if success:
+            # A correct password clears the account's counter, not the address's
+            _failures.pop(f"u:{username.lower()}", None)
+            return
+        if len(_failures) >= MAX_TRACKED_KEYS:
+            cutoff = now - ATTEMPT_WINDOW_SECONDS
+            for key in [k for k, v in _failures.items() if not v or v[-1] <= cutoff]:
+                del _failures[key]
+        for key, limit in _throttle_keys(username, ip):
+            _failures.setdefault(key, deque(maxlen=limit)).append(now)
+
+def login_user(username, password, ip=None):
+    """User record on success, None for wrong credentials; raises ServerBusy if the password could not be checked."""
+    if login_throttle_remaining(username, ip):
+        return None
+
     # Optimization: LOGIN should be real-time (ttl=0) to ensure security
     query = """
         SELECT u.*, s.name as shift_name 
@@ -46,22 +235,31 @@ def login_user(username, password):
     df = run_query(query, params={"u": username}, ttl=0)
     
     if df.empty:
+        _record_login_result(username, ip, False)
         return None
         
     user_record = df.iloc[0].to_dict()
     stored_pass = user_record['password']
     
-    if verify_password(stored_pass, password):
-        # Optional: Auto-migrate to hash if it was plain text
-        if stored_pass != hash_password(password):
-            new_hash = hash_password(password)
-            run_action("UPDATE users SET password = :p WHERE username = :u", {"p": new_hash, "u": username})
+    ok, valid = run_password_job("bcrypt verify", verify_password, stored_pass, password)
+    if not ok:
+        # Pool saturated: not the user's fault, so not counted as a failed attempt
+        raise ServerBusy()
+    _record_login_result(username, ip, valid)
+    if valid:
+        # Upgrade legacy or low-cost hashes once; an up-to-date bcrypt hash costs a single check
+        if needs_rehash(stored_pass):
+            ok, new_hash = run_password_job("bcrypt hash", hash_password, password)
+            if ok and run_action("UPDATE users SET password = :p WHERE username = :u", {"p": new_hash, "u": username}):
+                user_record['password'] = new_hash
         return user_record
         
     return None
 
 def register_user(username, password, name, region):
-    hashed_pw = hash_password(password)
+    ok, hashed_pw = run_password_job("bcrypt hash", hash_password, password)
+    if not ok:
+        raise ServerBusy()
     with st.spinner("Creating account..."):
         # Check existence first to avoid raw SQL error in UI
         if not run_query("SELECT username FROM users WHERE username = :u", {"u": username}, ttl=0).empty:
@@ -79,7 +277,9 @@ def update_user_profile_full(old_username, new_username, new_name, new_pass, cur
     # Hash the new password if it's different from the current one (which is should be if it's new plain text)
     # However, the UI passes the old hash if empty. We only hash if it's NOT the old hash.
     if new_pass != current_hashed_pass:
-        final_pass = hash_password(new_pass)
+        ok, final_pass = run_password_job("bcrypt hash", hash_password, new_pass)
+        if not ok:
+            return False, "Server busy, please try again"
     else:
         final_pass = current_hashed_pass
     
@@ -0,0 +1,133 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Dependency-tracked query cache shared by every session in the server process.
+# Each cached result is tagged with the tables it reads; writes invalidate only
+# the tables they touch instead of wiping every cached query for every user.
+
+MAX_ENTRIES = 512
+
+_READ_TABLES = re.compile(r"\b(?:FROM|JOIN)\s+([A-Za-z_][\w.]*)", re.IGNORECASE)
+_WRITE_TABLES = re.compile(
+    r"\b(?:INSERT\s+INTO|UPDATE|DELETE\s+FROM|TRUNCATE(?:\s+TABLE)?|ALTER\s+TABLE|DROP\s+TABLE(?:\s+IF\s+EXISTS)?|CREATE\s+TABLE(?:\s+IF\s+NOT\s+EXISTS)?)\s+([A-Za-z_][\w.]*)",
+    re.IGNORECASE,
+)
+# Words the patterns above can capture that are not table names (e.g. "DO UPDATE SET", "FROM unnest(...)")
+_NOT_TABLES = {"set", "select", "unnest", "lateral", "generate_series", "only"}
+# Views, by the tables they read: cached reads of a view are tagged with its base tables
+VIEWS = {"stock_availability": {"inventory", "stock_reservations"}}
+# Tables written by triggers whenever the key table is written (modules/migrations.py): reservations
+# follow requests (5), new names create items (6), inventory rows leave tombstones (7). A rename also
+# rewrites the item's name on requests / local_inventory / stock_reservations (11); those cascaded
+# writes are announced by the change feed without an origin, so every process applies them (12).
+TRIGGER_WRITES = {
+    "requests": {"stock_reservations", "items"},
+    "inventory": {"items", "inventory_tombstones"},
+    "local_inventory": {"items"},
+    "stock_logs": {"items"},
+}
+
+_lock = threading.Lock()
+_entries = OrderedDict()   # key -> (expires_at, tables, value)
+_by_table = {}             # table -> set of keys
+_versions = {}             # table -> write generation, bumped on every invalidation
+_generation = 0            # bumped by clear() so every table version changes at once
+_stats = {}                # table -> {"hits", "misses", "evictions"}
+
+def _clean(names):
+    tables = set()
+    for n in names:
+        n = n.lower().split(".")[-1]
+        if n not in _NOT_TABLES:
+            tables.add(n)
+    return frozenset(tables)
+
+def tables_read(query):
+    """Tables referenced by FROM/JOIN clauses of a SQL string (views resolved to their tables)."""
+    tables = _clean(_READ_TABLES.findall(query))
+    return frozenset(b for t in tables for b in VIEWS.get(t, (t,)))
+
+def tables_written(query):
+    """Tables modified by an INSERT/UPDATE/DELETE/DDL statement."""
+    return _clean(_WRITE_TABLES.findall(query))
+
+def make_key(query, params):
+    if not params: return (query, ())
+    return (query, tuple(sorted((k, repr(v)) for k, v in params.items())))
+
+def _bump(tables, field):
+    for t in tables or ("*",):
+        s = _stats.setdefault(t, {"hits": 0, "misses": 0, "evictions": 0})
+        s[field] += 1
+
+def _drop(key):
+    expires, tables, _ = _entries.pop(key)
+    for t in tables:
+        keys = _by_table.get(t)
+        if keys is not None:
+            keys.discard(key)
+    _bump(tables, "evictions")
+
+def get(key):
+    """Return the cached value for key, or None on a miss (expired entries count as misses)."""
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            _entries.move_to_end(key)
+            _bump(entry[1], "hits")
+            return entry[2]
+        if entry is not None:
+            _drop(key)
+        return None
+
+def put(key, value, tables, ttl, version=None):
+    """Cache value under key. version is the table_version() taken before the read ran;
+    if a write invalidated one of the tables meanwhile the (possibly stale) value is not stored."""
+    with _lock:
+        if version is not None and version != (_generation,) + tuple(_versions.get(t, 0) for t in tables):
+            _bump(tables, "misses")
+            return
+        if key in _entries:
+            _drop(key)
+        _entries[key] = (time.monotonic() + ttl, tables, value)
+        for t in tables:
+            _by_table.setdefault(t, set()).add(key)
+        _bump(tables, "misses")
+        while len(_entries) > MAX_ENTRIES:
+            _drop(next(iter(_entries)))
+
+def invalidate(tables):
+    """Drop every cached result that reads any of the given tables (or tables their triggers write)."""
+    tables = set(tables)
+    for t in list(tables):
+        tables |= TRIGGER_WRITES.get(t, set())
+    with _lock:
+        for t in tables:
+            _versions[t] = _versions.get(t, 0) + 1
+            for key in list(_by_table.get(t, ())):
+                if key in _entries:
+                    _drop(key)
+
+def clear():
+    """Drop every cached result (manual refresh, schema changes)."""
+    global _generation
+    with _lock:
+        for key in list(_entries):
+            _drop(key)
+        _generation += 1
+
+def table_version(*tables):
+    """Write generation of the given tables; changes whenever any of them is invalidated."""
+    with _lock:
+        return (_generation,) + tuple(_versions.get(t, 0) for t in tables)
+
+def stats():
+    """Per-table hit/miss/eviction counters with the derived hit rate."""
+    with _lock:
+        out = {}
+        for t, s in _stats.items():
+            total = s["hits"] + s["misses"]
+            out[t] = dict(s, cached=len(_by_table.get(t, ())), hit_rate=round(s["hits"] / total, 3) if total else 0.0)
+        return out
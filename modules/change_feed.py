@@ -0,0 +1,143 @@
+import select
+import threading
+import streamlit as st
+from modules import cache
+
+# Postgres LISTEN/NOTIFY change feed.
+# Triggers (migrations 2 and 9) emit NOTIFY warehouse_changes, '<table>' after writes to inventory,
+# requests, attendance, local_inventory and workers. One listener thread per server process turns those
+# into table-scoped cache invalidations, so writes from other processes, replicas or direct SQL
+# show up without polling the database. Payloads are '<table>@<application_name>' for statements
+# a client ran directly (migration 12); this process already invalidated the tables it wrote, so
+# its own notifications only reach subscribers. Fragments watch the resulting data versions
+# (see modules/views/common.py: watch_for_changes).
+
+CHANNEL = "warehouse_changes"
+
+class ChangeListener:
+    """
+    Listens on CHANNEL over a dedicated (unpooled) psycopg2 connection and calls
+    on_change(set_of_tables) for each batch of notifications. Tables written by origin
+    (this process's application_name) go to on_local instead, if given.
+    """
+
+    def __init__(self, engine, on_change=cache.invalidate, channel=CHANNEL, origin=None, on_local=None):
+        self.engine = engine
+        self.on_change = on_change
+        self.channel = channel
+        self.origin = origin
+        self.on_local = on_local
+        self.received = 0
+        self.skipped = 0
+        self._conn = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def connect(self):
+        cargs, cparams = self.engine.dialect.create_connect_args(self.engine.url)
+        conn = self.engine.dialect.loaded_dbapi.connect(*cargs, **cparams)
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f"LISTEN {self.channel};")
+        self._conn = conn
+
+    def poll_once(self, timeout=1.0):
+        """Wait up to timeout seconds for notifications; returns the set of changed tables (any origin)."""
+        if self._conn is None: self.connect()
+        if select.select([self._conn], [], [], timeout) == ([], [], []):
+            return set()
+        self._conn.poll()
+        tables, local = set(), set()
+        while self._conn.notifies:
+            table, _, origin = self._conn.notifies.pop(0).payload.partition("@")
+            (local if self.origin and origin == self.origin else tables).add(table)
+        local -= tables
+        if tables:
+            self.received += len(tables)
+            self.on_change(tables)
+        if local:
+            self.skipped += len(local)
+            if self.on_local: self.on_local(local)
+        return tables | local
+
+    def run(self):
+        backoff = 1
+        while not self._stop.is_set():
+            try:
+                self.poll_once(timeout=5)
+                backoff = 1
+            except Exception as e:
+                print(f"[Change Feed] Listener error, reconnecting in {backoff}s: {e}")
+                self.close()
+                # Anything may have changed while disconnected
+                cache.clear()
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 60)
+        self.close()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="change-feed-listener", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def connected(self):
+        return self._conn is not None
+
+    def close(self):
+        if self._conn is not None:
+            try: self._conn.close()
+            except Exception: pass
+            self._conn = None
+
+DEFAULT_WATCH_SECONDS = 5
+
+_lock = threading.Lock()
+_started = False
+_listener = None
+_listeners = []   # extra on_change callbacks, e.g. the dashboard refresher
+
+def subscribe(callback):
+    """Call callback(set_of_tables) whenever the feed reports changes."""
+    _listeners.append(callback)
+
+def _dispatch(tables):
+    cache.invalidate(tables)
+    _notify_subscribers(tables)
+
+def _notify_subscribers(tables):
+    for cb in _listeners:
+        try: cb(tables)
+        except Exception as e: print(f"[Change Feed] Subscriber error: {e}")
+
+def is_live():
+    """True while this process's listener is connected (writes elsewhere arrive within seconds)."""
+    return _listener is not None and _listener.connected
+
+def _settings():
+    try:
+        return st.secrets.get("change_feed", {})
+    except Exception:
+        return {}
+
+def watch_seconds():
+    """How often open views check (in memory) whether data they show has changed."""
+    return max(1, int(_settings().get("watch_seconds", DEFAULT_WATCH_SECONDS)))
+
+def start_change_listener(conn):
+    """Start the process-wide listener once. Disabled with [change_feed] enabled = false in secrets."""
+    global _started, _listener
+    if _started or conn is None: return _listener
+    with _lock:
+        if _started: return _listener
+        _started = True
+        if not _settings().get("enabled", True): return None
+        if conn.engine.dialect.driver != "psycopg2":
+            print(f"[Change Feed] Not started: requires psycopg2, found {conn.engine.dialect.driver}")
+            return None
+        from modules.database import APP_NAME
+        _listener = ChangeListener(conn.engine, on_change=_dispatch, origin=APP_NAME, on_local=_notify_subscribers).start()
+        return _listener
@@ -24,6 +24,7 @@ TEXT = {
     "refresh_data": "🔄 Refresh Data", "notes": "Notes / Remarks",
     "save_mod": "💾 Save Changes", "insufficient_stock_sk": "❌ STOP: Issue Qty > NTCC Stock!",
     "error_login": "Invalid Username or Password", "success_reg": "Registered successfully",
+    "error_busy": "Server busy, please try again in a moment",
     "local_inv": "Branch Inventory Reports", "req_form": "Bulk Order Form", 
     "role_night_sup": "Night Shift Supervisor (B)",
     "select_item": "Select Item", "qty_req": "Request Qty", "send_req": "🚀 Send Bulk Order",
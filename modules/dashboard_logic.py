@@ -0,0 +1,122 @@
+import threading
+import time
+import pandas as pd
+import streamlit as st
+from modules import change_feed
+from modules.database import run_query
+
+LOW_STOCK_THRESHOLD = 10
+
+# Every dashboard KPI in one round trip: counts are computed server-side and the
+# small chart series come back as JSON arrays instead of full row sets.
+SNAPSHOT_SQL = """
+    SELECT
+        (SELECT count(*) FROM workers WHERE status = 'Active') AS active_workers,
+        (SELECT count(*) FROM attendance WHERE date = :d) AS attendance_today,
+        (SELECT count(*) FROM attendance WHERE date = :d AND status = 'Present') AS present_today,
+        (SELECT count(*) FROM requests WHERE status = 'Pending') AS pending_requests,
+        (SELECT COALESCE(json_agg(t), '[]') FROM (
+            SELECT name_en, qty, reserved, available, location FROM stock_availability WHERE available < :low ORDER BY available ASC
+        ) t) AS low_stock,
+        (SELECT COALESCE(json_agg(t), '[]') FROM (
+            SELECT region, count(*) AS count FROM workers WHERE status = 'Active' GROUP BY region
+        ) t) AS workers_by_region,
+        (SELECT COALESCE(json_agg(t), '[]') FROM (
+            SELECT name_en AS item, available AS qty FROM stock_availability WHERE location = 'NSTC' ORDER BY available DESC LIMIT 10
+        ) t) AS top_stock,
+        (SELECT COALESCE(json_agg(t), '[]') FROM (
+            SELECT date, count(*) AS present_count FROM attendance
+            WHERE status = 'Present' AND date >= CAST(:d AS date) - 7
+            GROUP BY date ORDER BY date
+        ) t) AS attendance_trend
+"""
+
+def get_dashboard_snapshot(today=None):
+    """
+    All manager dashboard KPIs from a single query. Returns a dict of counts plus
+    small DataFrames for the detail table and charts, or None if the query failed.
+    """
+    today = today or pd.Timestamp.now().strftime('%Y-%m-%d')
+    # Uncached: the refresher is the only caller, so "updated Ns ago" is the age of the data itself
+    df = run_query(SNAPSHOT_SQL, {"d": today, "low": LOW_STOCK_THRESHOLD}, ttl=0)
+    if df.empty: return None
+    row = df.iloc[0]
+    return {
+        "date": today,
+        "active_workers": int(row['active_workers']),
+        "attendance_today": int(row['attendance_today']),
+        "present_today": int(row['present_today']),
+        "pending_requests": int(row['pending_requests']),
+        "low_stock": pd.DataFrame(row['low_stock'], columns=["name_en", "qty", "reserved", "available", "location"]),
+        "workers_by_region": pd.DataFrame(row['workers_by_region'], columns=["region", "count"]),
+        "top_stock": pd.DataFrame(row['top_stock'], columns=["item", "qty"]),
+        "attendance_trend": pd.DataFrame(row['attendance_trend'], columns=["date", "present_count"]),
+    }
+
+# ---- Shared snapshot service ----
+# One daemon thread per server process refreshes the snapshot on a fixed interval and every
+# manager_dashboard fragment reads it from memory, so database load does not grow with the
+# number of open dashboards. Interval: [dashboard] refresh_seconds in secrets.
+
+DEFAULT_REFRESH_SECONDS = 30
+
+# Tables the snapshot reads; change-feed notifications for these trigger an early refresh
+DASHBOARD_TABLES = {"workers", "attendance", "requests", "inventory", "stock_reservations"}
+
+_service_lock = threading.Lock()
+_thread = None
+_wake = threading.Event()
+_shared = {"snapshot": None, "refreshed_at": None, "error": None, "version": 0}
+
+def refresh_interval():
+    try:
+        return max(5, int(st.secrets.get("dashboard", {}).get("refresh_seconds", DEFAULT_REFRESH_SECONDS)))
+    except Exception:
+        return DEFAULT_REFRESH_SECONDS
+
+def refresh_shared_snapshot():
+    """Recompute the shared snapshot now (also used for the very first read)."""
+    try:
+        snap = get_dashboard_snapshot()
+    except Exception as e:
+        snap = None
+        _shared["error"] = str(e)
+    if snap is not None:
+        changed = not _same_snapshot(_shared["snapshot"], snap)
+        _shared.update(snapshot=snap, refreshed_at=time.time(), error=None, version=_shared["version"] + changed)
+    return snap
+
+def _same_snapshot(a, b):
+    if a is None or b is None: return a is b
+    return all(a[k].equals(b[k]) if isinstance(a[k], pd.DataFrame) else a[k] == b[k] for k in b)
+
+def request_refresh(tables=None):
+    """Wake the refresher early (change-feed subscriber)."""
+    if tables is None or DASHBOARD_TABLES & set(tables):
+        _wake.set()
+
+def snapshot_version():
+    """Increments whenever a shared refresh returns different numbers than the previous one."""
+    return _shared["version"]
+
+def _refresh_loop(interval):
+    while True:
+        _wake.wait(interval)
+        _wake.clear()
+        refresh_shared_snapshot()
+
+def get_shared_snapshot():
+    """
+    Latest shared snapshot as (snapshot, age_seconds). Starts the refresher thread on first use.
+    snapshot is None if no refresh has succeeded yet.
+    """
+    global _thread
+    if _thread is None:
+        with _service_lock:
+            if _thread is None:
+                refresh_shared_snapshot()
+                _thread = threading.Thread(target=_refresh_loop, args=(refresh_interval(),), name="dashboard-refresher", daemon=True)
+                _thread.start()
+                change_feed.subscribe(request_refresh)
+    refreshed_at = _shared["refreshed_at"]
+    return _shared["snapshot"], (time.time() - refreshed_at) if refreshed_at else None
@@ -1,47 +1,114 @@
 
+import time
+import uuid
 import streamlit as st
-import pandas as pd
 from sqlalchemy import text
+from modules import cache, migrations, perf
 
 # Database Connection
 # Lazy loading to prevent import errors and st.stop() at module level
 _conn = None
 
+# Identifies this server process to Postgres; the change feed uses it to skip its own writes
+APP_NAME = f"warehouse-{uuid.uuid4().hex[:12]}"
+
+# Passed through st.connection to create_engine. psycopg2's "values_plus_batch" mode sends
+# executemany() calls as pages of statements per round trip instead of one round trip per row.
+ENGINE_OPTIONS = {
+    "executemany_mode": "values_plus_batch",
+    "executemany_batch_page_size": 500,
+    "connect_args": {"application_name": APP_NAME},
+}
+
 def get_connection():
     global _conn
     if _conn is not None:
         return _conn
     try:
-        _conn = st.connection("supabase", type="sql")
+        try:
+            _conn = st.connection("supabase", type="sql", **ENGINE_OPTIONS)
+        except TypeError:
+            # Not the psycopg2 driver (e.g. psycopg 3, which pipelines executemany itself)
+            _conn = st.connection("supabase", type="sql")
         return _conn
     except Exception as e:
         st.error(f"⚠️ Connection Error: {e}")
         return None
 
-def run_query(query, params=None, ttl=600):
+def run_query(query, params=None, ttl=600, tables=None):
+    import pandas as pd  # Deferred so the login page renders before pandas is loaded
     c = get_connection()
     if not c: return pd.DataFrame()
+    start = time.perf_counter()
+    status = "bypass"
     try: 
         # Caching strategy: Default strict cache (10 mins) for extreme speed.
-        # Writes will auto-invalidate via st.cache_data.clear()
-        return c.query(query, params=params, ttl=ttl)
+        # Results are tagged with the tables they read; writes invalidate only those tables.
+        if not ttl:
+            df = _read_sql(c, query, params)
+        else:
+            tables = tuple(sorted(tables if tables is not None else cache.tables_read(query)))
+            key = cache.make_key(query, params)
+            df = cache.get(key)
+            status = "hit"
+            if df is None:
+                status = "miss"
+                version = cache.table_version(*tables)
+                df = _read_sql(c, query, params)
+                cache.put(key, df, tables, ttl, version)
+            df = df.copy()
+        perf.record("query", query, time.perf_counter() - start, len(df), status)
+        return df
     except Exception as e: 
+        perf.record("query", query, time.perf_counter() - start, cache=status, error=str(e))
         st.error(f"DB Error: {e}")
         return pd.DataFrame()
 
-def run_action(query, params=None):
+def _read_sql(c, query, params):
+    import pandas as pd
+    with c.engine.connect() as conn:
+        return pd.read_sql(text(query), conn, params=params)
+
+def invalidate_tables(*tables):
+    """Invalidate cached reads of the given tables (call after writes made through a raw session)."""
+    cache.invalidate(tables)
+
+def clear_query_cache():
+    """Drop every cached query result (manual refresh)."""
+    cache.clear()
+
+def data_version(*tables):
+    """Opaque version of the given tables; changes after any write to them."""
+    return cache.table_version(*tables)
+
+def run_action(query, params=None, tables=None):
     c = get_connection()
     if not c: return False
+    start = time.perf_counter()
     try:
         with c.session as session:
-            session.execute(text(query) if isinstance(query, str) else query, params)
+            result = session.execute(text(query) if isinstance(query, str) else query, params)
             session.commit()
-            st.cache_data.clear() # Auto-invalidate cache on write
+        perf.record("action", query, time.perf_counter() - start, result.rowcount)
+        _invalidate_written([str(query)], tables)
         return True
     except Exception as e: 
+        perf.record("action", query, time.perf_counter() - start, error=str(e))
         st.error(f"DB Action Error: {e}")
         return False
 
+def _invalidate_written(queries, tables=None):
+    if tables is None:
+        tables = set()
+        for q in queries:
+            written = cache.tables_written(q)
+            if not written:
+                # Unrecognised statement: fall back to a full clear rather than serve stale data
+                cache.clear()
+                return
+            tables |= written
+    cache.invalidate(tables)
+
 def log_audit(user_name: str, action: str, details: str = None, module: str = None):
     """Log user action to audit_logs table for tracking."""
     try:
@@ -52,155 +119,64 @@ def log_audit(user_name: str, action: str, details: str = None, module: str = No
     except Exception:
         pass  # Silent fail - audit logging should not break main functionality
 
-def run_batch_action(actions):
+def group_actions(actions):
     """
-    Executes a list of (query, params) tuples in a single transaction.
-    actions: list of (query_string, params_dict)
+    Coalesces consecutive (query, params) tuples that share the same SQL into
+    (query, [params, ...]) groups, preserving statement order.
+    """
+    groups = []
+    for q, p in actions:
+        if groups and groups[-1][0] == q:
+            groups[-1][1].append(p)
+        else:
+            groups.append((q, [p]))
+    return groups
+
+def execute_bulk(session, groups):
+    """
+    Sends each (query, [params, ...]) group as a single executemany on the given session.
+    The caller owns the transaction.
+    """
+    for q, rows in groups:
+        if not rows: continue
+        session.execute(text(q), rows if len(rows) > 1 else rows[0])
+
+def run_bulk_action(groups):
+    """
+    Executes (query, [params, ...]) groups in a single transaction, one executemany per group.
+    Use when the statements of a batch are independent and can be sent set-wise,
+    e.g. all DELETEs followed by all INSERTs.
     """
     c = get_connection()
     if not c: return False
     try:
         with st.spinner("Processing..."):
             with c.session as session:
-                for q, p in actions:
-                    session.execute(text(q), p)
+                for q, rows in groups:
+                    # Timed per group so each statement shape gets its own fingerprint
+                    start = time.perf_counter()
+                    try:
+                        execute_bulk(session, [(q, rows)])
+                    except Exception as e:
+                        perf.record("bulk", q, time.perf_counter() - start, len(rows), error=str(e))
+                        raise
+                    perf.record("bulk", q, time.perf_counter() - start, len(rows))
                 session.commit()
-                st.cache_data.clear() # Auto-invalidate cache on batch write
+            _invalidate_written({q for q, _ in groups})
             return True
     except Exception as e: st.error(f"Batch DB Error: {e}"); return False
 
+def run_batch_action(actions):
+    """
+    Executes a list of (query, params) tuples in a single transaction.
+    actions: list of (query_string, params_dict)
+    Consecutive identical statements are sent together as one executemany.
+    """
+    return run_bulk_action(group_actions(actions))
+
 def init_db():
-    # Users Table
-    run_action("""
-        CREATE TABLE IF NOT EXISTS users (
-            username TEXT PRIMARY KEY,
-            password TEXT NOT NULL,
-            name TEXT,
-            role TEXT,
-            region TEXT,
-            shift_id INTEGER,
-            created_at TIMESTAMP DEFAULT NOW()
-        );
-    """)
-
-    # Inventory Table
-    run_action("""
-        CREATE TABLE IF NOT EXISTS inventory (
-            id SERIAL PRIMARY KEY,
-            name_en TEXT NOT NULL,
-            category TEXT,
-            unit TEXT,
-            qty INTEGER DEFAULT 0,
-            location TEXT NOT NULL,
-            status TEXT,
-            last_updated TIMESTAMP DEFAULT NOW(),
-            UNIQUE(name_en, location)
-        );
-    """)
-
-    # Requests Table
-    run_action("""
-        CREATE TABLE IF NOT EXISTS requests (
-            req_id SERIAL PRIMARY KEY,
-            supervisor_name TEXT,
-            region TEXT,
-            item_name TEXT,
-            category TEXT,
-            qty INTEGER,
-            unit TEXT,
-            status TEXT,
-            request_date TIMESTAMP DEFAULT NOW(),
-            notes TEXT
-        );
-    """)
-
-    # Workers Table
-    run_action("""
-        CREATE TABLE IF NOT EXISTS workers (
-            id SERIAL PRIMARY KEY,
-            name TEXT NOT NULL,
-            role TEXT,
-            region TEXT,
-            status TEXT DEFAULT 'Active',
-            created_at TIMESTAMP DEFAULT NOW()
-        );
-    """)
-    # Shifts Table
-    run_action("""
-        CREATE TABLE IF NOT EXISTS shifts (
-            id SERIAL PRIMARY KEY,
-            name TEXT NOT NULL,
-            start_time TEXT,
-            end_time TEXT
-        );
-    """)
-    # Attendance Table
-    run_action("""
-        CREATE TABLE IF NOT EXISTS attendance (
-            id SERIAL PRIMARY KEY,
-            worker_id INTEGER REFERENCES workers(id),
-            date DATE NOT NULL,
-            status TEXT,
-            shift_id INTEGER,
-            return_date DATE,
-            notes TEXT,
-            supervisor TEXT,
-            created_at TIMESTAMP DEFAULT NOW()
-        );
-    """)
-    
-    # 4.2 Migration (Safe Add Columns)
-    try:
-        run_action("ALTER TABLE workers ADD COLUMN IF NOT EXISTS shift_id INTEGER;")
-        run_action("ALTER TABLE users ADD COLUMN IF NOT EXISTS shift_id INTEGER;")
-        run_action("ALTER TABLE workers ADD COLUMN IF NOT EXISTS emp_id TEXT;") # Add EMP ID
-        run_action("ALTER TABLE inventory ADD COLUMN IF NOT EXISTS last_updated TIMESTAMP DEFAULT NOW();") # Fix for UndefinedColumn error
-        
-        # Performance Indexes
-        run_action("CREATE INDEX IF NOT EXISTS idx_inv_loc ON inventory(location);")
-        run_action("CREATE INDEX IF NOT EXISTS idx_inv_name ON inventory(name_en);")
-        run_action("CREATE INDEX IF NOT EXISTS idx_workers_reg ON workers(region);")
-        run_action("CREATE INDEX IF NOT EXISTS idx_att_date ON attendance(date);")
-        run_action("CREATE INDEX IF NOT EXISTS idx_req_stat ON requests(status);")
-        
-        # Support for Batch Upsert in Warehouse
-        run_action("CREATE TABLE IF NOT EXISTS local_inventory (region TEXT, item_name TEXT, qty INTEGER, last_updated TIMESTAMP, updated_by TEXT);")
-        run_action("CREATE UNIQUE INDEX IF NOT EXISTS idx_local_inv_uniq ON local_inventory (region, item_name);")
-        
-        # Stock Logs Table (Fix for UndefinedColumn)
-        run_action("""
-            CREATE TABLE IF NOT EXISTS stock_logs (
-                id SERIAL PRIMARY KEY,
-                log_date TIMESTAMP DEFAULT NOW(),
-                item_name TEXT,
-                change_amount INTEGER,
-                location TEXT,
-                action_by TEXT,
-                action_type TEXT,
-                unit TEXT,
-                new_qty INTEGER,
-                user_name TEXT -- Legacy support
-            );
-        """)
-        # Safe migrations for stock_logs
-        run_action("ALTER TABLE stock_logs ADD COLUMN IF NOT EXISTS action_by TEXT;")
-        run_action("ALTER TABLE stock_logs ADD COLUMN IF NOT EXISTS unit TEXT;")
-        run_action("ALTER TABLE stock_logs ADD COLUMN IF NOT EXISTS new_qty INTEGER;")
-        run_action("ALTER TABLE stock_logs ADD COLUMN IF NOT EXISTS user_name TEXT;")
-        
-        # Audit Logs Table - Track all user actions
-        run_action("""
-            CREATE TABLE IF NOT EXISTS audit_logs (
-                id SERIAL PRIMARY KEY,
-                timestamp TIMESTAMP DEFAULT NOW(),
-                user_name TEXT NOT NULL,
-                action TEXT NOT NULL,
-                details TEXT,
-                module TEXT
-            );
-        """)
-        run_action("CREATE INDEX IF NOT EXISTS idx_audit_time ON audit_logs(timestamp DESC);")
-        
-    except Exception as e:
-        # Log migration errors but don't crash - these are often just "column already exists"
-        print(f"[DB Migration] Non-critical warning: {e}")
+    """Ensure the schema is at the latest migration. The DDL runs once per process;
+    every later rerun is an in-memory check (see modules/migrations.py)."""
+    c = get_connection()
+    if not c: return False
+    return migrations.migrate(c)
@@ -1,62 +1,264 @@
 
-import streamlit as st
+import time
 import pandas as pd
 from sqlalchemy import text
-from modules.database import run_query, run_action, get_connection
+from modules import inventory_store, perf
+from modules.database import run_query, run_action, get_connection, invalidate_tables
 
 def get_inventory(location):
-    # Optimization: Cache inventory for short duration (10s) to balance freshness and speed
-    return run_query("SELECT name_en, category, unit, qty, location, status FROM inventory WHERE location = :loc ORDER BY name_en", params={"loc": location}, ttl=600)
+    # Rows come from the shared per-location store, kept fresh by delta sync instead of full reloads
+    # qty is on hand; reserved is held for approved requests not yet issued, available = qty - reserved
+    inv = inventory_store.get(location)
+    reserved = run_query("SELECT item_id, SUM(qty)::int AS reserved FROM stock_reservations WHERE location = :loc AND status = 'Reserved' GROUP BY item_id",
+                         params={"loc": location}, ttl=600)
+    df = inv.merge(reserved, on='item_id', how='left') if not reserved.empty else inv.assign(reserved=0)
+    df['reserved'] = df['reserved'].fillna(0).astype(int)
+    df['available'] = df['qty'] - df['reserved']
+    return df.sort_values('name_en')[['item_id', 'name_en', 'category', 'unit', 'qty', 'reserved', 'available', 'location', 'status']].reset_index(drop=True)
 
-def update_central_stock(item_name, location, change, user, action_desc, unit):
+# Relative UPDATE ... RETURNING feeding the ledger insert: one statement, no read-modify-write race
+STOCK_MOVEMENT_SQL = """
+    WITH moved AS (
+        UPDATE inventory SET qty = qty + :chg, last_updated = NOW()
+        WHERE item_id = COALESCE(CAST(:item_id AS integer), (SELECT id FROM items WHERE name_en = :name)) AND location = :loc
+        RETURNING item_id, qty
+    )
+    INSERT INTO stock_logs (log_date, action_by, action_type, item_id, item_name, location, change_amount, new_qty, unit)
+    SELECT NOW(), :u, :act, item_id, :name, :loc, :chg, qty, :unit FROM moved
+    RETURNING new_qty
+"""
+
+def apply_stock_movement(session, item_name, location, change, user, action_desc, unit, item_id=None):
+    """
+    Moves stock by a relative amount and writes its stock_logs row in one statement
+    on the caller's session (the caller commits). Returns the new balance, or None
+    if the item does not exist at that location. Pass item_id when known; otherwise
+    it is looked up from item_name.
+    """
+    row = session.execute(text(STOCK_MOVEMENT_SQL), {"chg": int(change), "item_id": item_id, "name": item_name, "loc": location,
+                                                      "u": user, "act": action_desc, "unit": unit}).first()
+    return row[0] if row else None
+
+def update_central_stock(item_name, location, change, user, action_desc, unit, item_id=None):
     change = int(change)
-    # Use 0 TTL for writes/checks to ensure consistency
-    df = run_query("SELECT qty FROM inventory WHERE name_en = :name AND location = :loc", params={"name": item_name, "loc": location}, ttl=0)
-    if df.empty: return False, "Item not found"
-    current_qty = int(df.iloc[0]['qty'])
-    new_qty = current_qty + change
-    
     conn = get_connection()
     if not conn: return False, "Database connection failed"
     
+    start = time.perf_counter()
     try:
         with conn.session as s:
-            s.execute(text("UPDATE inventory SET qty = :nq WHERE name_en = :name AND location = :loc"), {"nq": new_qty, "name": item_name, "loc": location})
-            s.execute(text("INSERT INTO stock_logs (log_date, action_by, action_type, item_name, location, change_amount, new_qty, unit) VALUES (NOW(), :u, :act, :item, :loc, :chg, :nq, :unit)"),
-                      {"u": user, "act": action_desc, "item": item_name, "loc": location, "chg": change, "nq": new_qty, "unit": unit})
+            new_qty = apply_stock_movement(s, item_name, location, change, user, action_desc, unit, item_id)
+            if new_qty is None: return False, "Item not found"
             s.commit()
-            st.cache_data.clear() # Manually clear cache since we used raw session
+        perf.record("action", STOCK_MOVEMENT_SQL, time.perf_counter() - start, 1)
+        invalidate_tables("inventory", "stock_logs") # Raw session bypasses run_action's invalidation
         return True, "Success"
-    except Exception as e: return False, str(e)
+    except Exception as e:
+        perf.record("action", STOCK_MOVEMENT_SQL, time.perf_counter() - start, error=str(e))
+        return False, str(e)
+
+# Whole multi-line transfer in one statement: take stock from the source (only where it suffices),
+# upsert-and-increment the destination rows, and write both ledger legs from the returned balances.
+# Names are resolved to item ids once; everything after that joins on item_id.
+TRANSFER_SQL = """
+    WITH lines AS (
+        SELECT it.id AS item_id, l.* FROM unnest(CAST(:names AS text[]), CAST(:qtys AS integer[]), CAST(:units AS text[])) AS l(name_en, qty, unit)
+        LEFT JOIN items it ON it.name_en = l.name_en
+    ),
+    moved_out AS (
+        UPDATE inventory i SET qty = i.qty - l.qty, last_updated = NOW()
+        FROM lines l
+        WHERE i.item_id = l.item_id AND i.location = :src AND i.qty >= l.qty
+        RETURNING i.item_id, i.name_en, i.qty, l.qty AS moved, l.unit
+    ),
+    moved_in AS (
+        INSERT INTO inventory (item_id, name_en, category, unit, qty, location, last_updated)
+        SELECT item_id, name_en, 'Transferred', unit, moved, :dest, NOW() FROM moved_out
+        ON CONFLICT (item_id, location) DO UPDATE SET qty = inventory.qty + EXCLUDED.qty, last_updated = NOW()
+        RETURNING item_id, qty
+    ),
+    ledger AS (
+        INSERT INTO stock_logs (log_date, action_by, action_type, item_id, item_name, location, change_amount, new_qty, unit)
+        SELECT NOW(), :u, 'Transfer Out', o.item_id, o.name_en, :src, -o.moved, o.qty, o.unit FROM moved_out o
+        UNION ALL
+        SELECT NOW(), :u, 'Transfer In', o.item_id, o.name_en, :dest, o.moved, n.qty, o.unit FROM moved_in n JOIN moved_out o ON o.item_id = n.item_id
+    )
+    SELECT l.name_en, o.qty AS src_qty, n.qty AS dest_qty, s.qty AS available
+    FROM lines l
+    LEFT JOIN moved_out o ON o.item_id = l.item_id
+    LEFT JOIN moved_in n ON n.item_id = l.item_id
+    LEFT JOIN inventory s ON s.item_id = l.item_id AND s.location = :src
+"""
+
+def transfer_stock_batch(lines, user, src="SNC", dest="NSTC"):
+    """
+    Transfers several items between warehouses in one transaction.
+    lines: list of (item_name, qty, unit). Quantities for repeated items are combined.
+    Returns (ok, results) with one {"item", "qty", "ok", "msg"} dict per input line.
+    Nothing is applied unless every line can be moved.
+    """
+    totals = {}
+    for item, qty, unit in lines:
+        q, u = totals.get(item, (0, unit))
+        totals[item] = (q + int(qty), u)
+    if not totals: return True, []
+
+    conn = get_connection()
+    if not conn: return False, [{"item": i, "qty": int(q), "ok": False, "msg": "Database connection failed"} for i, q, _ in lines]
+
+    names = list(totals)
+    params = {"names": names, "qtys": [totals[n][0] for n in names], "units": [totals[n][1] for n in names],
+              "src": src, "dest": dest, "u": user}
+    start = time.perf_counter()
+    try:
+        with conn.session as s:
+            outcome = {r.name_en: r for r in s.execute(text(TRANSFER_SQL), params)}
+            failed = {n for n, r in outcome.items() if r.src_qty is None}
+            if not failed:
+                s.commit()
+        perf.record("action", TRANSFER_SQL, time.perf_counter() - start, len(names))
+    except Exception as e:
+        perf.record("action", TRANSFER_SQL, time.perf_counter() - start, len(names), error=str(e))
+        return False, [{"item": i, "qty": int(q), "ok": False, "msg": str(e)} for i, q, _ in lines]
+
+    results = []
+    for item, qty, _ in lines:
+        r = outcome[item]
+        if r.src_qty is not None:
+            msg = f"{src} {r.src_qty} / {dest} {r.dest_qty}" if not failed else "Rolled back (other lines failed)"
+        elif r.available is None:
+            msg = f"Not found in {src}"
+        else:
+            msg = f"Requested {totals[item][0]} > Available {r.available}"
+        results.append({"item": item, "qty": int(qty), "ok": not failed, "msg": msg})
+    if failed: return False, results
+    invalidate_tables("inventory", "stock_logs")
+    return True, results
+
+# Bulk issue of approved requests from NSTC in one statement: issued quantities are summed per
+# item and taken with one UPDATE (only where the total is on hand); one ledger row per request
+# with its running balance derived from the returned balance, and the requests of the items
+# that moved are marked Issued (the requests trigger consumes their reservations).
+ISSUE_SQL = """
+    WITH lines AS (
+        SELECT r.item_id, r.item_name AS name_en, l.* FROM unnest(CAST(:ids AS integer[]), CAST(:qtys AS integer[]),
+                             CAST(:units AS text[]), CAST(:regions AS text[]), CAST(:notes AS text[]))
+            AS l(req_id, qty, unit, region, notes)
+        JOIN requests r ON r.req_id = l.req_id
+    ),
+    totals AS (
+        SELECT item_id, SUM(qty)::int AS qty FROM lines GROUP BY item_id
+    ),
+    issued AS (
+        UPDATE inventory i SET qty = i.qty - t.qty, last_updated = NOW()
+        FROM totals t
+        WHERE i.item_id = t.item_id AND i.location = 'NSTC' AND i.qty >= t.qty
+        RETURNING i.item_id, i.qty, t.qty AS moved
+    ),
+    ledger AS (
+        INSERT INTO stock_logs (log_date, action_by, action_type, item_id, item_name, location, change_amount, new_qty, unit)
+        SELECT NOW(), :u, 'Issued ' || l.region, l.item_id, l.name_en, 'NSTC', -l.qty,
+               o.qty + o.moved - SUM(l.qty) OVER (PARTITION BY l.item_id ORDER BY l.req_id), l.unit
+        FROM lines l JOIN issued o ON o.item_id = l.item_id
+    ),
+    done AS (
+        UPDATE requests r SET status = 'Issued', qty = l.qty, notes = l.notes
+        FROM lines l JOIN issued o ON o.item_id = l.item_id
+        WHERE r.req_id = l.req_id
+        RETURNING r.req_id
+    )
+    SELECT l.req_id, t.qty AS total, o.qty AS new_qty, s.qty AS available, d.req_id IS NOT NULL AS issued
+    FROM lines l
+    JOIN totals t ON t.item_id = l.item_id
+    LEFT JOIN issued o ON o.item_id = l.item_id
+    LEFT JOIN done d ON d.req_id = l.req_id
+    LEFT JOIN inventory s ON s.item_id = l.item_id AND s.location = 'NSTC'
+"""
+
+def issue_requests_batch(lines, user, partial=False):
+    """
+    Issues approved requests from NSTC in one transaction.
+    lines: list of (req_id, item_name, qty, unit, region, notes).
+    All-or-nothing by default; with partial=True the lines of items that are short are
+    skipped and the rest is issued. Requests no longer Approved (e.g. issued meanwhile
+    from another session) are skipped.
+    Returns (ok, results) with one {"req_id", "item", "qty", "ok", "msg"} dict per input line.
+    """
+    if not lines: return True, []
+    conn = get_connection()
+    if not conn: return False, [{"req_id": l[0], "item": l[1], "qty": int(l[2]), "ok": False, "msg": "Database connection failed"} for l in lines]
+
+    start = time.perf_counter()
+    try:
+        with conn.session as s:
+            # Lock the requests first so two storekeepers cannot issue the same request twice
+            open_ids = set(s.execute(text("SELECT req_id FROM requests WHERE req_id = ANY(CAST(:ids AS integer[])) AND status = 'Approved' FOR UPDATE"),
+                                     {"ids": [int(l[0]) for l in lines]}).scalars())
+            todo = [l for l in lines if int(l[0]) in open_ids]
+            outcome = {}
+            if todo:
+                params = {"ids": [int(l[0]) for l in todo], "qtys": [int(l[2]) for l in todo],
+                          "units": [l[3] for l in todo], "regions": [l[4] for l in todo], "notes": [l[5] or "" for l in todo], "u": user}
+                outcome = {r.req_id: r for r in s.execute(text(ISSUE_SQL), params)}
+            committed = bool(outcome) and (partial or all(r.issued for r in outcome.values()))
+            if committed:
+                s.commit()
+        perf.record("action", ISSUE_SQL, time.perf_counter() - start, len(todo))
+    except Exception as e:
+        perf.record("action", ISSUE_SQL, time.perf_counter() - start, len(lines), error=str(e))
+        return False, [{"req_id": l[0], "item": l[1], "qty": int(l[2]), "ok": False, "msg": str(e)} for l in lines]
+
+    results = []
+    for req_id, item, qty, *_ in lines:
+        r = outcome.get(int(req_id))
+        if r is None:
+            ok, msg = False, "No longer approved"
+        elif r.issued:
+            ok = committed
+            msg = f"NSTC {r.new_qty}" if committed else "Rolled back (other lines failed)"
+        elif r.available is None:
+            ok, msg = False, "Not found in NSTC"
+        else:
+            ok, msg = False, f"Requested {r.total} > On hand {r.available}"
+        results.append({"req_id": req_id, "item": item, "qty": int(qty), "ok": ok, "msg": msg})
+    if committed:
+        invalidate_tables("inventory", "stock_logs", "requests")
+    return all(r["ok"] for r in results), results
 
 def transfer_stock(item_name, qty, user, unit):
-    qty = int(qty)
-    ok, msg = update_central_stock(item_name, "SNC", -qty, user, "Transfer Out", unit)
-    if not ok: return False, msg
-    df = run_query("SELECT * FROM inventory WHERE name_en = :n AND location = 'NSTC'", params={"n": item_name}, ttl=0)
-    if df.empty: run_action("INSERT INTO inventory (name_en, category, unit, qty, location) VALUES (:n, 'Transferred', :u, 0, 'NSTC')", params={"n": item_name, "u": unit})
-    ok2, msg2 = update_central_stock(item_name, "NSTC", qty, user, "Transfer In", unit)
-    if not ok2: return False, msg2
-    return True, "Transfer Complete"
-
-def handle_external_transfer(item_name, my_loc, ext_proj, action, qty, user, unit):
+    ok, results = transfer_stock_batch([(item_name, int(qty), unit)], user)
+    return (True, "Transfer Complete") if ok else (False, results[0]["msg"] if results else "Transfer failed")
+
+def handle_external_transfer(item_name, my_loc, ext_proj, action, qty, user, unit, item_id=None):
     desc = f"Loan {action} {ext_proj}"
     change = -int(qty) if action == "Lend" else int(qty)
-    return update_central_stock(item_name, my_loc, change, user, desc, unit)
-
-def receive_from_cww(item_name, dest_loc, qty, user, unit):
-    return update_central_stock(item_name, dest_loc, int(qty), user, "Received from CWW", unit)
-
-def update_local_inventory(region, item_name, new_qty, user):
-    new_qty = int(new_qty)
-    # Check if record exists for this item in this region
-    df = run_query("SELECT id FROM local_inventory WHERE region = :r AND item_name = :i", params={"r": region, "i": item_name}, ttl=0)
-    if not df.empty:
-        return run_action("UPDATE local_inventory SET qty = :q, last_updated = NOW(), updated_by = :u WHERE region = :r AND item_name = :i", 
-                          params={"q": new_qty, "u": user, "r": region, "i": item_name})
-    else:
-        return run_action("INSERT INTO local_inventory (region, item_name, qty, last_updated, updated_by) VALUES (:r, :i, :q, NOW(), :u)", 
-                          params={"r": region, "i": item_name, "q": new_qty, "u": user})
+    return update_central_stock(item_name, my_loc, change, user, desc, unit, item_id)
+
+def receive_from_cww(item_name, dest_loc, qty, user, unit, item_id=None):
+    return update_central_stock(item_name, dest_loc, int(qty), user, "Received from CWW", unit, item_id)
+
+# One upsert on (region, item_id); writes nothing if the item no longer exists
+LOCAL_INVENTORY_UPSERT_SQL = """
+    INSERT INTO local_inventory (region, item_id, item_name, qty, last_updated, updated_by)
+    SELECT :r, id, name_en, :q, NOW(), :u FROM items WHERE id = :iid
+    ON CONFLICT (region, item_id) DO UPDATE SET item_name = EXCLUDED.item_name, qty = EXCLUDED.qty, last_updated = NOW(), updated_by = EXCLUDED.updated_by
+"""
+
+def update_local_inventory(region, item_id, new_qty, user):
+    conn = get_connection()
+    if not conn: return False, "Database connection failed"
+    start = time.perf_counter()
+    try:
+        with conn.session as s:
+            written = s.execute(text(LOCAL_INVENTORY_UPSERT_SQL), {"r": region, "iid": int(item_id), "q": int(new_qty), "u": user}).rowcount
+            if not written: return False, "Item not found"
+            s.commit()
+        perf.record("action", LOCAL_INVENTORY_UPSERT_SQL, time.perf_counter() - start, written)
+        invalidate_tables("local_inventory")
+        return True, "Success"
+    except Exception as e:
+        perf.record("action", LOCAL_INVENTORY_UPSERT_SQL, time.perf_counter() - start, error=str(e))
+        return False, str(e)
 
 def create_request(supervisor, region, item, category, qty, unit):
     return run_action("INSERT INTO requests (supervisor_name, region, item_name, category, qty, unit, status, request_date) VALUES (:s, :r, :i, :c, :q, :u, 'Pending', NOW())",
@@ -86,7 +288,126 @@ def update_request_status(req_id, status, final_qty=None, notes=None):
 def delete_request(req_id):
     return run_action("DELETE FROM requests WHERE req_id = :id", params={"id": req_id})
 
-def get_local_inventory_by_item(region, item_name):
+def get_local_inventory_by_item(region, item_id):
     # Optimizing read-heavy view
-    df = run_query("SELECT qty FROM local_inventory WHERE region = :r AND item_name = :i", params={"r": region, "i": item_name}, ttl=600)
+    df = run_query("SELECT qty FROM local_inventory WHERE region = :r AND item_id = :iid", params={"r": region, "iid": int(item_id)}, ttl=600)
     return int(df.iloc[0]['qty']) if not df.empty else 0
+
+# ---- Allocation of NSTC stock to pending requests ----
+
+# Live position per item: on hand, and reserved for approved requests not yet issued
+STOCK_POSITION_SQL = """
+    SELECT item_id, name_en AS item_name, qty AS on_hand, reserved
+    FROM stock_availability
+    WHERE location = :loc AND item_id = ANY(CAST(:items AS integer[]))
+"""
+
+def stock_position(item_ids, location="NSTC"):
+    """Uncached on_hand / reserved per item_id (items missing at location are simply absent)."""
+    return run_query(STOCK_POSITION_SQL, {"loc": location, "items": [int(i) for i in item_ids if pd.notna(i)]}, ttl=0)
+
+def allocate_requests(requests, position):
+    """
+    Allocate available stock (on_hand - reserved) to requests in priority order: oldest
+    request_date first, then region. A running total per item is compared with the item's
+    availability, so no two requests in the batch are promised the same units; once a request
+    does not fit, later requests for that item wait too. Expects req_id, item_id, item_name,
+    region, request_date and qty; returns them in priority order with available / allocated columns.
+    """
+    pos = position.set_index('item_id')
+    available = (pos['on_hand'] - pos['reserved']).clip(lower=0) if not pos.empty else pd.Series(dtype=int)
+    df = requests.sort_values(['request_date', 'region', 'req_id']).copy()
+    df['available'] = df['item_id'].map(available).fillna(0).astype(int)
+    df['allocated'] = df.groupby('item_id', dropna=False)['qty'].cumsum() <= df['available']
+    return df
+
+def allocation_summary(allocation, position):
+    """Per item: on hand, reserved, pending requested, allocated and available-to-promise after allocation."""
+    g = allocation.assign(alloc_qty=allocation['qty'].where(allocation['allocated'], 0)).groupby('item_id', dropna=False)
+    out = pd.DataFrame({"item_name": g['item_name'].first(), "requested": g['qty'].sum(), "allocated": g['alloc_qty'].sum(),
+                        "available": g['available'].first()})
+    pos = position.set_index('item_id')
+    out['item_name'] = pos['item_name'].reindex(out.index).fillna(out['item_name'])
+    out['on_hand'] = pos['on_hand'].reindex(out.index).fillna(0).astype(int)
+    out['reserved'] = pos['reserved'].reindex(out.index).fillna(0).astype(int)
+    out['atp'] = out['available'] - out['allocated']
+    out['short'] = out['requested'] - out['allocated']
+    return out.reset_index()[['item_name', 'on_hand', 'reserved', 'requested', 'allocated', 'atp', 'short']]
+
+# Approval re-checked against live availability in the same statement that approves: every pending
+# request for the batch's items is queued oldest first (at the manager's quantity where edited), and a
+# request of the batch is approved only if the running total up to it fits in on hand - reserved.
+APPROVE_SQL = """
+    WITH lines AS (
+        SELECT * FROM unnest(CAST(:ids AS integer[]), CAST(:qtys AS integer[]), CAST(:notes AS text[])) AS l(req_id, qty, notes)
+    ),
+    queue AS (
+        SELECT r.req_id, r.item_id, COALESCE(l.qty, r.qty) AS qty, l.req_id IS NOT NULL AS in_batch,
+               SUM(COALESCE(l.qty, r.qty)) OVER (PARTITION BY r.item_id ORDER BY r.request_date, r.region, r.req_id) AS running
+        FROM requests r LEFT JOIN lines l ON l.req_id = r.req_id
+        WHERE r.status = 'Pending' AND r.item_id IN (SELECT item_id FROM requests WHERE req_id IN (SELECT req_id FROM lines))
+    ),
+    fits AS (
+        SELECT q.req_id, q.qty, q.running - q.qty AS ahead, GREATEST(COALESCE(a.available, 0), 0) AS available,
+               q.running <= GREATEST(COALESCE(a.available, 0), 0) AS ok
+        FROM queue q LEFT JOIN stock_availability a ON a.item_id = q.item_id AND a.location = 'NSTC'
+        WHERE q.in_batch
+    ),
+    approved AS (
+        UPDATE requests r SET status = 'Approved', qty = f.qty, notes = l.notes
+        FROM fits f JOIN lines l ON l.req_id = f.req_id
+        WHERE r.req_id = f.req_id AND f.ok AND r.status = 'Pending'
+        RETURNING r.req_id
+    )
+    SELECT l.req_id, f.available, f.ahead, f.req_id IS NOT NULL AS pending, a.req_id IS NOT NULL AS approved
+    FROM lines l
+    LEFT JOIN fits f ON f.req_id = l.req_id
+    LEFT JOIN approved a ON a.req_id = l.req_id
+"""
+
+# Taken before APPROVE_SQL so its snapshot already includes approvals committed by whoever held the rows
+LOCK_STOCK_SQL = """
+    SELECT i.id FROM inventory i
+    WHERE i.location = 'NSTC' AND i.item_id IN (SELECT item_id FROM requests WHERE req_id = ANY(CAST(:ids AS integer[])))
+    ORDER BY i.id FOR UPDATE
+"""
+
+def approve_requests_batch(approvals, rejections=()):
+    """
+    Applies a manager review in one transaction: rejections first, then approvals allocated
+    FIFO (request_date, region) across every pending request for the same items, against
+    NSTC stock locked for the duration, so concurrent reviews cannot promise the same units.
+    approvals: list of (req_id, qty, notes); rejections: list of (req_id, notes).
+    Returns (ok, results) with one {"req_id", "ok", "msg"} dict per approval line.
+    """
+    conn = get_connection()
+    if not conn: return False, [{"req_id": a[0], "ok": False, "msg": "Database connection failed"} for a in approvals]
+    ids = [int(a[0]) for a in approvals]
+    start = time.perf_counter()
+    try:
+        with conn.session as s:
+            if rejections:
+                s.execute(text("UPDATE requests SET status = 'Rejected', notes = :n WHERE req_id = :id AND status = 'Pending'"),
+                          [{"id": int(rid), "n": note} for rid, note in rejections])
+            outcome = {}
+            if approvals:
+                s.execute(text(LOCK_STOCK_SQL), {"ids": ids})
+                params = {"ids": ids, "qtys": [int(a[1]) for a in approvals], "notes": [a[2] or "" for a in approvals]}
+                outcome = {r.req_id: r for r in s.execute(text(APPROVE_SQL), params)}
+            s.commit()
+        perf.record("action", APPROVE_SQL, time.perf_counter() - start, len(ids) + len(rejections))
+    except Exception as e:
+        perf.record("action", APPROVE_SQL, time.perf_counter() - start, len(ids) + len(rejections), error=str(e))
+        return False, [{"req_id": rid, "ok": False, "msg": str(e)} for rid in ids]
+    invalidate_tables("requests")
+
+    results = []
+    for rid in ids:
+        r = outcome.get(rid)
+        if r is not None and r.approved:
+            results.append({"req_id": rid, "ok": True, "msg": "Approved"})
+        elif r is None or not r.pending:
+            results.append({"req_id": rid, "ok": False, "msg": "No longer pending"})
+        else:
+            results.append({"req_id": rid, "ok": False, "msg": f"Short: {int(r.available)} available, {int(r.ahead)} queued for older requests"})
+    return all(r["ok"] for r in results), results
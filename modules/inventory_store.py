@@ -0,0 +1,124 @@
+import threading
+import time
+import streamlit as st
+from sqlalchemy import text
+from modules import cache, perf
+from modules.database import get_connection
+
+# Per-location inventory store shared by every session in the server process.
+# A location is loaded in full once. After that, whenever the inventory table has been written
+# (in this process, or anywhere else as reported by the change feed) or the copy is older than
+# max_age_seconds, only rows and tombstones written by transactions at or past the watermark
+# are fetched and merged in. Rows and tombstones carry the id of the writing transaction
+# (migrations 7 and 10); the watermark is the xmin of the sync's snapshot, so a transaction
+# still running during a sync is read again on the next one, however late it commits.
+# Settings: [inventory_store] max_age_seconds in secrets.
+
+DEFAULT_MAX_AGE_SECONDS = 60
+# Tombstones are purged after a day (migration 7); a store idle for longer reloads in full
+FULL_RELOAD_SECONDS = 12 * 3600
+
+COLUMNS = ["id", "item_id", "name_en", "category", "unit", "qty", "location", "status", "last_updated"]
+
+FULL_SQL = "SELECT id, item_id, name_en, category, unit, qty, location, status, last_updated FROM inventory WHERE location = :loc"
+
+DELTA_SQL = """
+    SELECT 'row' AS kind, id, item_id, name_en, category, unit, qty, location, status, last_updated
+    FROM inventory WHERE location = :loc AND change_xid >= CAST(:since AS xid8)
+    UNION ALL
+    -- Rows that are back in the location (moved out and in again) are not dropped, whatever the order
+    SELECT 'deleted', t.inventory_id, NULL, NULL, NULL, NULL, NULL, t.location, NULL, t.deleted_at
+    FROM inventory_tombstones t WHERE t.location = :loc AND t.change_xid >= CAST(:since AS xid8)
+      AND NOT EXISTS (SELECT 1 FROM inventory i WHERE i.id = t.inventory_id AND i.location = t.location)
+"""
+
+# Oldest transaction still running; everything older has committed or aborted
+WATERMARK_SQL = "SELECT CAST(pg_snapshot_xmin(pg_current_snapshot()) AS text)"
+
+def _settings():
+    try:
+        return st.secrets.get("inventory_store", {})
+    except Exception:
+        return {}
+
+def max_age_seconds():
+    return max(1, int(_settings().get("max_age_seconds", DEFAULT_MAX_AGE_SECONDS)))
+
+class LocationStore:
+    """Inventory rows of one location, by inventory id, plus the watermark they are synced to."""
+
+    def __init__(self, location):
+        self.location = location
+        self.rows = {}
+        self.watermark = None       # transaction id the rows are complete up to (exclusive)
+        self.synced_version = None  # cache.table_version("inventory") at the last sync
+        self.synced_at = 0.0
+        self.frame = None           # DataFrame of rows, rebuilt after a sync that changed something
+        self.stats = {"full_loads": 0, "delta_syncs": 0, "rows_fetched": 0, "served_from_memory": 0, "errors": 0}
+        self._lock = threading.Lock()
+
+    def get(self):
+        import pandas as pd
+        # Taken before syncing: a write that lands during the sync changes it again
+        version = cache.table_version("inventory")
+        with self._lock:
+            if self.synced_version != version or time.time() - self.synced_at > max_age_seconds():
+                self._sync(version)
+            else:
+                self.stats["served_from_memory"] += 1
+            if self.frame is None:
+                self.frame = pd.DataFrame(list(self.rows.values()), columns=COLUMNS)
+            return self.frame
+
+    def _sync(self, version):
+        conn = get_connection()
+        if not conn: return
+        full = self.watermark is None or time.time() - self.synced_at > FULL_RELOAD_SECONDS
+        query = FULL_SQL if full else DELTA_SQL
+        params = {"loc": self.location}
+        if not full:
+            params["since"] = self.watermark
+        start = time.perf_counter()
+        try:
+            with conn.engine.connect() as c:
+                # Taken first: transactions below it have finished and are all visible to the next statement
+                synced_to = c.execute(text(WATERMARK_SQL)).scalar()
+                fetched = c.execute(text(query), params).mappings().all()
+        except Exception as e:
+            perf.record("query", query, time.perf_counter() - start, cache="store", error=str(e))
+            self.stats["errors"] += 1
+            print(f"[Inventory Store] Sync of {self.location} failed, serving the previous copy: {e}")
+            return
+        perf.record("query", query, time.perf_counter() - start, len(fetched), "store")
+
+        if full:
+            self.rows = {r["id"]: {k: r[k] for k in COLUMNS} for r in fetched}
+            self.stats["full_loads"] += 1
+        else:
+            for r in fetched:
+                if r["kind"] == "deleted":
+                    self.rows.pop(r["id"], None)
+                else:
+                    self.rows[r["id"]] = {k: r[k] for k in COLUMNS}
+            self.stats["delta_syncs"] += 1
+        self.stats["rows_fetched"] += len(fetched)
+        if full or fetched:
+            self.frame = None
+        self.watermark = synced_to
+        self.synced_version = version
+        self.synced_at = time.time()
+
+_lock = threading.Lock()
+_stores = {}   # location -> LocationStore
+
+def get(location):
+    """Inventory rows of a location (shared DataFrame: copy before modifying)."""
+    store = _stores.get(location)
+    if store is None:
+        with _lock:
+            store = _stores.setdefault(location, LocationStore(location))
+    return store.get()
+
+def stats():
+    """Per-location sync counters and watermark, for the Performance page."""
+    return [dict(location=loc, rows=len(s.rows), watermark=s.watermark, **s.stats) for loc, s in sorted(_stores.items())]
@@ -0,0 +1,146 @@
+
+from modules.database import run_query, run_action, run_bulk_action
+
+# Attendance grid for one region / shift / date in a single query: every active worker with the
+# status and notes already recorded for that day, defaulting to Present for workers not yet marked.
+ATTENDANCE_SHEET_SQL = """
+    SELECT w.id AS "ID", w.name AS "Name", w.role AS "Role",
+           COALESCE(a.status, 'Present') AS "Status", COALESCE(a.notes, '') AS "Notes",
+           a.worker_id IS NOT NULL AS "Recorded"
+    FROM workers w
+    LEFT JOIN (
+        -- Latest row per worker in case older duplicates exist for the day
+        SELECT DISTINCT ON (worker_id) worker_id, status, notes FROM attendance
+        WHERE date = :d AND shift_id = :sid
+        ORDER BY worker_id, id DESC
+    ) a ON a.worker_id = w.id
+    WHERE w.region = :r AND w.shift_id = :sid AND w.status = 'Active'
+    ORDER BY w.name
+"""
+
+def get_attendance_sheet(region, shift_id, date_str):
+    """
+    Editable attendance grid (ID, Name, Role, Status, Notes) for the supervisor view.
+    Recorded is False for workers with no attendance row yet (their Present is only a default).
+    """
+    return run_query(ATTENDANCE_SHEET_SQL, {"r": region, "sid": shift_id, "d": date_str})
+
+def attendance_changes(sheet, edited):
+    """Rows of the edited grid that must be written: edited status/notes, or not recorded yet."""
+    notes = edited['Notes'].fillna('')
+    changed = (~sheet['Recorded'].astype(bool)) | (edited['Status'] != sheet['Status']) | (notes != sheet['Notes'].fillna(''))
+    return edited.loc[changed].assign(Notes=notes[changed])
+
+# Set-based upsert on the (worker_id, date, shift_id) unique index (migration 3)
+UPSERT_ATTENDANCE_SQL = """
+    INSERT INTO attendance (worker_id, date, shift_id, status, notes, supervisor)
+    SELECT t.worker_id, CAST(:d AS date), :sid, t.status, t.notes, :sup
+    FROM unnest(CAST(:ids AS integer[]), CAST(:statuses AS text[]), CAST(:notes AS text[])) AS t(worker_id, status, notes)
+    ON CONFLICT (worker_id, date, shift_id)
+    DO UPDATE SET status = EXCLUDED.status, notes = EXCLUDED.notes, supervisor = EXCLUDED.supervisor
+"""
+
+def save_attendance(changes, date_str, shift_id, supervisor):
+    """Write the changed grid rows in one statement. Returns True on success (or nothing to write)."""
+    if changes.empty: return True
+    return run_action(UPSERT_ATTENDANCE_SQL, {
+        "ids": [int(i) for i in changes['ID']], "statuses": list(changes['Status']), "notes": list(changes['Notes']),
+        "d": date_str, "sid": int(shift_id), "sup": supervisor,
+    })
+
+# ---- Worker roster edits ----
+
+WORKER_EDIT_COLUMNS = ["name", "emp_id", "role", "region", "status", "shift_name"]
+UPDATE_WORKER_SQL = "UPDATE workers SET name=:n, emp_id=:e, role=:r, region=:reg, status=:s, shift_id=:sid WHERE id=:id"
+
+def worker_changes(original, edited, shift_lookup):
+    """
+    Vectorised diff of the worker editor against the frame it was given.
+    Returns (updates, errors): UPDATE parameters for changed rows that pass validation,
+    and one message per changed row that was rejected.
+    """
+    before = original.set_index('id')[WORKER_EDIT_COLUMNS]
+    after = edited.set_index('id')[WORKER_EDIT_COLUMNS]
+    same = (before == after) | (before.isna() & after.isna())
+    changed = after[~same.all(axis=1)].copy()
+    if changed.empty: return [], []
+
+    changed['emp_id'] = changed['emp_id'].fillna('').astype(str).str.strip()
+    changed['sid'] = changed['shift_name'].map(shift_lookup)
+    problems = {
+        "Name is required": changed['name'].fillna('').astype(str).str.strip() == '',
+        "Invalid EMP ID: Numbers only": (changed['emp_id'] != '') & ~changed['emp_id'].str.fullmatch(r'\d+'),
+        "Unknown shift": changed['shift_name'].notna() & changed['sid'].isna(),
+    }
+    errors = []
+    rejected = changed.index[:0]
+    for msg, mask in problems.items():
+        for wid, name in changed.loc[mask, 'name'].items():
+            errors.append(f"{name or f'Worker #{wid}'}: {msg}")
+        rejected = rejected.union(changed.index[mask])
+    valid = changed.drop(index=rejected)
+    valid['sid'] = valid['sid'].astype(object).where(valid['sid'].notna(), None)
+    updates = [
+        {"id": int(wid), "n": r.name, "e": r.emp_id, "r": r.role, "reg": r.region, "s": r.status,
+         "sid": None if r.sid is None else int(r.sid)}
+        for wid, r in zip(valid.index, valid.itertuples(index=False))
+    ]
+    return updates, errors
+
+def save_worker_edits(original, edited, shift_lookup):
+    """Apply only the changed, valid rows of the worker editor in one transaction. Returns (ok, updated, errors)."""
+    updates, errors = worker_changes(original, edited, shift_lookup)
+    if not updates: return True, 0, errors
+    return run_bulk_action([(UPDATE_WORKER_SQL, updates)]), len(updates), errors
+
+# ---- Worker search ----
+
+WORKER_PAGE_SIZE = 50
+
+WORKER_SEARCH_SQL = """
+    SELECT w.id, w.created_at, w.name, w.emp_id, w.role, w.region, w.status, w.shift_id, s.name as shift_name
+    FROM workers w
+    LEFT JOIN shifts s ON w.shift_id = s.id
+    {where}
+    ORDER BY w.id DESC
+    {limit}
+"""
+
+def _worker_filters(term=None, region=None, shift_id=None, status=None):
+    clauses, params = [], {}
+    if term:
+        # Substring match served by the trigram indexes (migration 4); LIKE wildcards in the term are literal
+        params["pat"] = "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        clauses.append("(w.name ILIKE :pat OR w.emp_id ILIKE :pat)")
+    if region:
+        params["reg"] = region; clauses.append("w.region = :reg")
+    if shift_id is not None:
+        params["sid"] = int(shift_id); clauses.append("w.shift_id = :sid")
+    if status:
+        params["st"] = status; clauses.append("w.status = :st")
+    return clauses, params
+
+def search_workers(term=None, region=None, shift_id=None, status=None, after_id=None, page_size=WORKER_PAGE_SIZE):
+    """
+    One page of workers (newest first) matching the filters, using keyset paging on id.
+    Pass the last id of the previous page as after_id. page_size=None returns every match.
+    Returns (page, has_more).
+    """
+    clauses, params = _worker_filters(term, region, shift_id, status)
+    if after_id is not None:
+        params["after"] = int(after_id); clauses.append("w.id < :after")
+    where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+    limit = ""
+    if page_size:
+        # One extra row tells whether another page exists
+        params["lim"] = int(page_size) + 1; limit = "LIMIT :lim"
+    df = run_query(WORKER_SEARCH_SQL.format(where=where, limit=limit), params)
+    if page_size and len(df) > page_size:
+        return df.iloc[:page_size], True
+    return df, False
+
+def count_workers(term=None, region=None, shift_id=None, status=None):
+    clauses, params = _worker_filters(term, region, shift_id, status)
+    where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+    df = run_query(f"SELECT count(*) AS n FROM workers w {where}", params)
+    return int(df['n'].iloc[0]) if not df.empty else 0
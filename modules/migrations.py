@@ -0,0 +1,536 @@
+import threading
+import time
+from sqlalchemy import text
+from modules import cache
+
+# Versioned schema migrations.
+# Each entry is (version, description, [statements]); versions must be strictly increasing.
+# Applied versions are recorded in schema_version, so every deploy runs its pending DDL once
+# and every later rerun only pays an in-memory "already at head" check.
+
+MIGRATIONS = [
+    (1, "Baseline schema (previously created by init_db on every rerun)", [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            username TEXT PRIMARY KEY,
+            password TEXT NOT NULL,
+            name TEXT,
+            role TEXT,
+            region TEXT,
+            shift_id INTEGER,
+            created_at TIMESTAMP DEFAULT NOW()
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS inventory (
+            id SERIAL PRIMARY KEY,
+            name_en TEXT NOT NULL,
+            category TEXT,
+            unit TEXT,
+            qty INTEGER DEFAULT 0,
+            location TEXT NOT NULL,
+            status TEXT,
+            last_updated TIMESTAMP DEFAULT NOW(),
+            UNIQUE(name_en, location)
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS requests (
+            req_id SERIAL PRIMARY KEY,
+            supervisor_name TEXT,
+            region TEXT,
+            item_name TEXT,
+            category TEXT,
+            qty INTEGER,
+            unit TEXT,
+            status TEXT,
+            request_date TIMESTAMP DEFAULT NOW(),
+            notes TEXT
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS workers (
+            id SERIAL PRIMARY KEY,
+            name TEXT NOT NULL,
+            role TEXT,
+            region TEXT,
+            status TEXT DEFAULT 'Active',
+            created_at TIMESTAMP DEFAULT NOW()
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS shifts (
+            id SERIAL PRIMARY KEY,
+            name TEXT NOT NULL,
+            start_time TEXT,
+            end_time TEXT
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS attendance (
+            id SERIAL PRIMARY KEY,
+            worker_id INTEGER REFERENCES workers(id),
+            date DATE NOT NULL,
+            status TEXT,
+            shift_id INTEGER,
+            return_date DATE,
+            notes TEXT,
+            supervisor TEXT,
+            created_at TIMESTAMP DEFAULT NOW()
+        );
+        """,
+        "ALTER TABLE workers ADD COLUMN IF NOT EXISTS shift_id INTEGER;",
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS shift_id INTEGER;",
+        "ALTER TABLE workers ADD COLUMN IF NOT EXISTS emp_id TEXT;",
+        "ALTER TABLE inventory ADD COLUMN IF NOT EXISTS last_updated TIMESTAMP DEFAULT NOW();",
+        "CREATE INDEX IF NOT EXISTS idx_inv_loc ON inventory(location);",
+        "CREATE INDEX IF NOT EXISTS idx_inv_name ON inventory(name_en);",
+        "CREATE INDEX IF NOT EXISTS idx_workers_reg ON workers(region);",
+        "CREATE INDEX IF NOT EXISTS idx_att_date ON attendance(date);",
+        "CREATE INDEX IF NOT EXISTS idx_req_stat ON requests(status);",
+        "CREATE TABLE IF NOT EXISTS local_inventory (region TEXT, item_name TEXT, qty INTEGER, last_updated TIMESTAMP, updated_by TEXT);",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_local_inv_uniq ON local_inventory (region, item_name);",
+        """
+        CREATE TABLE IF NOT EXISTS stock_logs (
+            id SERIAL PRIMARY KEY,
+            log_date TIMESTAMP DEFAULT NOW(),
+            item_name TEXT,
+            change_amount INTEGER,
+            location TEXT,
+            action_by TEXT,
+            action_type TEXT,
+            unit TEXT,
+            new_qty INTEGER,
+            user_name TEXT -- Legacy support
+        );
+        """,
+        "ALTER TABLE stock_logs ADD COLUMN IF NOT EXISTS action_by TEXT;",
+        "ALTER TABLE stock_logs ADD COLUMN IF NOT EXISTS unit TEXT;",
+        "ALTER TABLE stock_logs ADD COLUMN IF NOT EXISTS new_qty INTEGER;",
+        "ALTER TABLE stock_logs ADD COLUMN IF NOT EXISTS user_name TEXT;",
+        """
+        CREATE TABLE IF NOT EXISTS audit_logs (
+            id SERIAL PRIMARY KEY,
+            timestamp TIMESTAMP DEFAULT NOW(),
+            user_name TEXT NOT NULL,
+            action TEXT NOT NULL,
+            details TEXT,
+            module TEXT
+        );
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_audit_time ON audit_logs(timestamp DESC);",
+    ]),
+    (2, "Change-feed NOTIFY triggers on inventory, requests, attendance and local_inventory", [
+        """
+        CREATE OR REPLACE FUNCTION notify_table_change() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('warehouse_changes', TG_TABLE_NAME);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+    ] + [
+        stmt
+        for table in ("inventory", "requests", "attendance", "local_inventory")
+        for stmt in (
+            f"DROP TRIGGER IF EXISTS trg_notify_{table} ON {table};",
+            # Statement-level: one notification per write statement, and Postgres folds
+            # duplicate payloads within a transaction
+            f"CREATE TRIGGER trg_notify_{table} AFTER INSERT OR UPDATE OR DELETE ON {table} "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION notify_table_change();",
+        )
+    ]),
+    (3, "One attendance row per worker, date and shift", [
+        # Keep the latest row of any duplicates left by the old delete-then-insert submission
+        """
+        DELETE FROM attendance a USING attendance b
+        WHERE a.worker_id = b.worker_id AND a.date = b.date
+          AND a.shift_id IS NOT DISTINCT FROM b.shift_id AND a.id < b.id;
+        """,
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_att_worker_day ON attendance (worker_id, date, shift_id);",
+    ]),
+    (4, "Trigram search indexes on workers.name / emp_id, shift filter index", [
+        # pg_trgm ships with Supabase; on servers without it the search still works, unindexed
+        """
+        DO $$
+        BEGIN
+            CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        EXCEPTION WHEN OTHERS THEN
+            RAISE NOTICE 'pg_trgm not available: %', SQLERRM;
+        END $$;
+        """,
+        """
+        DO $$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+                CREATE INDEX IF NOT EXISTS idx_workers_name_trgm ON workers USING gin (name gin_trgm_ops);
+                CREATE INDEX IF NOT EXISTS idx_workers_emp_trgm ON workers USING gin (emp_id gin_trgm_ops);
+            END IF;
+        END $$;
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_workers_shift ON workers(shift_id);",
+    ]),
+    (5, "Stock reservations for approved requests, stock_availability view", [
+        # One row per request ever approved: Reserved until issued (Consumed) or rejected/cancelled (Released)
+        """
+        CREATE TABLE IF NOT EXISTS stock_reservations (
+            req_id INTEGER PRIMARY KEY,
+            item_name TEXT NOT NULL,
+            location TEXT NOT NULL,
+            qty INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'Reserved',
+            created_at TIMESTAMP DEFAULT NOW(),
+            closed_at TIMESTAMP
+        );
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_reservations_open ON stock_reservations (item_name, location) INCLUDE (qty) WHERE status = 'Reserved';",
+        # Kept in step with requests.status by trigger, so every approve/issue/reject path
+        # (bulk review, storekeeper issue, scripts) maintains reservations in the same transaction
+        """
+        CREATE OR REPLACE FUNCTION sync_stock_reservation() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                UPDATE stock_reservations SET status = 'Released', closed_at = NOW()
+                WHERE req_id = OLD.req_id AND status = 'Reserved';
+                RETURN NULL;
+            END IF;
+            IF NEW.status = 'Approved' THEN
+                INSERT INTO stock_reservations (req_id, item_name, location, qty)
+                VALUES (NEW.req_id, NEW.item_name, 'NSTC', NEW.qty)
+                ON CONFLICT (req_id) DO UPDATE
+                SET item_name = EXCLUDED.item_name, qty = EXCLUDED.qty, status = 'Reserved', closed_at = NULL;
+            ELSIF TG_OP = 'UPDATE' THEN
+                IF OLD.status = 'Approved' THEN
+                    UPDATE stock_reservations
+                    SET status = CASE WHEN NEW.status IN ('Issued', 'Received') THEN 'Consumed' ELSE 'Released' END,
+                        closed_at = NOW()
+                    WHERE req_id = OLD.req_id AND status = 'Reserved';
+                END IF;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        "DROP TRIGGER IF EXISTS trg_reserve_stock ON requests;",
+        "CREATE TRIGGER trg_reserve_stock AFTER INSERT OR UPDATE OF status, qty, item_name OR DELETE ON requests "
+        "FOR EACH ROW EXECUTE FUNCTION sync_stock_reservation();",
+        # Requests approved before this migration
+        """
+        INSERT INTO stock_reservations (req_id, item_name, location, qty)
+        SELECT req_id, item_name, 'NSTC', qty FROM requests WHERE status = 'Approved'
+        ON CONFLICT (req_id) DO NOTHING;
+        """,
+        # inventory columns plus what is promised (reserved) and what is left to promise (available)
+        """
+        CREATE OR REPLACE VIEW stock_availability AS
+        SELECT i.id, i.name_en, i.category, i.unit, i.qty, i.location, i.status, i.last_updated,
+               COALESCE(r.reserved, 0) AS reserved, i.qty - COALESCE(r.reserved, 0) AS available
+        FROM inventory i
+        LEFT JOIN (
+            SELECT item_name, location, SUM(qty)::int AS reserved
+            FROM stock_reservations WHERE status = 'Reserved'
+            GROUP BY item_name, location
+        ) r ON r.item_name = i.name_en AND r.location = i.location;
+        """,
+    ]),
+    (6, "Items catalog with integer ids referenced by inventory, requests, local_inventory, stock_logs, stock_reservations", [
+        """
+        CREATE TABLE IF NOT EXISTS items (
+            id SERIAL PRIMARY KEY,
+            name_en TEXT NOT NULL UNIQUE,
+            category TEXT,
+            unit TEXT,
+            created_at TIMESTAMP DEFAULT NOW()
+        );
+        """,
+        # Every name in use: inventory first so its category/unit win, then names only seen in history
+        """
+        INSERT INTO items (name_en, category, unit)
+        SELECT DISTINCT ON (name_en) name_en, category, unit FROM (
+            SELECT name_en, category, unit, 1 AS pref FROM inventory
+            UNION ALL SELECT item_name, category, unit, 2 FROM requests WHERE item_name IS NOT NULL
+            UNION ALL SELECT item_name, NULL, NULL, 3 FROM local_inventory WHERE item_name IS NOT NULL
+            UNION ALL SELECT item_name, NULL, unit, 4 FROM stock_logs WHERE item_name IS NOT NULL
+            UNION ALL SELECT item_name, NULL, NULL, 5 FROM stock_reservations
+        ) n
+        ORDER BY name_en, pref
+        ON CONFLICT (name_en) DO NOTHING;
+        """,
+    ] + [
+        stmt
+        for table, name_col in (("inventory", "name_en"), ("requests", "item_name"), ("local_inventory", "item_name"),
+                                ("stock_logs", "item_name"), ("stock_reservations", "item_name"))
+        for stmt in (
+            f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS item_id INTEGER REFERENCES items(id);",
+            f"UPDATE {table} t SET item_id = it.id FROM items it WHERE it.name_en = t.{name_col} AND t.item_id IS NULL;",
+        )
+    ] + [
+        "ALTER TABLE inventory ALTER COLUMN item_id SET NOT NULL;",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_inv_item_loc ON inventory (item_id, location);",
+        "CREATE INDEX IF NOT EXISTS idx_req_item ON requests (item_id);",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_local_inv_item ON local_inventory (region, item_id);",
+        "CREATE INDEX IF NOT EXISTS idx_stock_logs_item ON stock_logs (item_id, log_date);",
+        "DROP INDEX IF EXISTS idx_reservations_open;",
+        "CREATE INDEX IF NOT EXISTS idx_reservations_open ON stock_reservations (item_id, location) INCLUDE (qty) WHERE status = 'Reserved';",
+        # Writers that only know the name (views, scripts, older code paths) still get item_id:
+        # it is looked up from the name column given as trigger argument, creating the item if new
+        """
+        CREATE OR REPLACE FUNCTION fill_item_id() RETURNS trigger AS $$
+        DECLARE
+            item_key TEXT := to_jsonb(NEW) ->> TG_ARGV[0];
+        BEGIN
+            IF item_key IS NULL OR (TG_OP = 'INSERT' AND NEW.item_id IS NOT NULL) THEN
+                RETURN NEW;
+            END IF;
+            SELECT id INTO NEW.item_id FROM items WHERE name_en = item_key;
+            IF NEW.item_id IS NULL THEN
+                INSERT INTO items (name_en, category, unit)
+                VALUES (item_key, to_jsonb(NEW) ->> 'category', to_jsonb(NEW) ->> 'unit')
+                ON CONFLICT (name_en) DO UPDATE SET name_en = EXCLUDED.name_en
+                RETURNING id INTO NEW.item_id;
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+    ] + [
+        stmt
+        for table, name_col in (("inventory", "name_en"), ("requests", "item_name"), ("local_inventory", "item_name"),
+                                ("stock_logs", "item_name"))
+        for stmt in (
+            f"DROP TRIGGER IF EXISTS trg_item_id_{table} ON {table};",
+            f"CREATE TRIGGER trg_item_id_{table} BEFORE INSERT OR UPDATE OF {name_col} ON {table} "
+            f"FOR EACH ROW EXECUTE FUNCTION fill_item_id('{name_col}');",
+        )
+    ] + [
+        # Reservations carry the request's item_id (filled by the BEFORE trigger above)
+        """
+        CREATE OR REPLACE FUNCTION sync_stock_reservation() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                UPDATE stock_reservations SET status = 'Released', closed_at = NOW()
+                WHERE req_id = OLD.req_id AND status = 'Reserved';
+                RETURN NULL;
+            END IF;
+            IF NEW.status = 'Approved' THEN
+                INSERT INTO stock_reservations (req_id, item_id, item_name, location, qty)
+                VALUES (NEW.req_id, NEW.item_id, NEW.item_name, 'NSTC', NEW.qty)
+                ON CONFLICT (req_id) DO UPDATE
+                SET item_id = EXCLUDED.item_id, item_name = EXCLUDED.item_name, qty = EXCLUDED.qty,
+                    status = 'Reserved', closed_at = NULL;
+            ELSIF TG_OP = 'UPDATE' THEN
+                IF OLD.status = 'Approved' THEN
+                    UPDATE stock_reservations
+                    SET status = CASE WHEN NEW.status IN ('Issued', 'Received') THEN 'Consumed' ELSE 'Released' END,
+                        closed_at = NOW()
+                    WHERE req_id = OLD.req_id AND status = 'Reserved';
+                END IF;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        """
+        CREATE OR REPLACE VIEW stock_availability AS
+        SELECT i.id, i.name_en, i.category, i.unit, i.qty, i.location, i.status, i.last_updated,
+               COALESCE(r.reserved, 0) AS reserved, i.qty - COALESCE(r.reserved, 0) AS available, i.item_id
+        FROM inventory i
+        LEFT JOIN (
+            SELECT item_id, location, SUM(qty)::int AS reserved
+            FROM stock_reservations WHERE status = 'Reserved'
+            GROUP BY item_id, location
+        ) r ON r.item_id = i.item_id AND r.location = i.location;
+        """,
+    ]),
+    (7, "inventory.last_updated maintained by trigger, tombstones for deleted/moved rows (delta sync)", [
+        # clock_timestamp(), not NOW(): the row time is close to commit even in long transactions
+        """
+        CREATE OR REPLACE FUNCTION touch_inventory() RETURNS trigger AS $$
+        BEGIN
+            NEW.last_updated := clock_timestamp();
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        "DROP TRIGGER IF EXISTS trg_touch_inventory ON inventory;",
+        "CREATE TRIGGER trg_touch_inventory BEFORE INSERT OR UPDATE ON inventory FOR EACH ROW EXECUTE FUNCTION touch_inventory();",
+        "UPDATE inventory SET last_updated = NOW() WHERE last_updated IS NULL;",
+        "CREATE INDEX IF NOT EXISTS idx_inv_loc_updated ON inventory (location, last_updated);",
+        """
+        CREATE TABLE IF NOT EXISTS inventory_tombstones (
+            id SERIAL PRIMARY KEY,
+            inventory_id INTEGER NOT NULL,
+            location TEXT NOT NULL,
+            deleted_at TIMESTAMP NOT NULL DEFAULT clock_timestamp()
+        );
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_inv_tomb_loc ON inventory_tombstones (location, deleted_at);",
+        "CREATE INDEX IF NOT EXISTS idx_inv_tomb_time ON inventory_tombstones (deleted_at);",
+        # A row leaves a location when it is deleted or moved (e.g. the NTCC -> NSTC rename).
+        # Deletes: once per statement from the transition table, also purging tombstones older than
+        # a day (deletes are rare, so no scheduled job is needed). Moves: per row, only when location is set.
+        """
+        CREATE OR REPLACE FUNCTION inventory_tombstone_deleted() RETURNS trigger AS $$
+        BEGIN
+            DELETE FROM inventory_tombstones WHERE deleted_at < clock_timestamp() - INTERVAL '1 day';
+            INSERT INTO inventory_tombstones (inventory_id, location) SELECT id, location FROM gone;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        """
+        CREATE OR REPLACE FUNCTION inventory_tombstone_moved() RETURNS trigger AS $$
+        BEGIN
+            IF OLD.location IS DISTINCT FROM NEW.location THEN
+                INSERT INTO inventory_tombstones (inventory_id, location) VALUES (OLD.id, OLD.location);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        "DROP TRIGGER IF EXISTS trg_inventory_tombstone_deleted ON inventory;",
+        "CREATE TRIGGER trg_inventory_tombstone_deleted AFTER DELETE ON inventory REFERENCING OLD TABLE AS gone "
+        "FOR EACH STATEMENT EXECUTE FUNCTION inventory_tombstone_deleted();",
+        "DROP TRIGGER IF EXISTS trg_inventory_tombstone_moved ON inventory;",
+        "CREATE TRIGGER trg_inventory_tombstone_moved AFTER UPDATE OF location ON inventory "
+        "FOR EACH ROW EXECUTE FUNCTION inventory_tombstone_moved();",
+    ]),
+    (8, "Renaming an inventory row renames its item; item_id is the only natural key", [
+        # Inventory rows own the catalog name: a rename must keep the item_id (and its history),
+        # so the name lookup only runs on insert and a rename is pushed to items and the other locations
+        "DROP TRIGGER IF EXISTS trg_item_id_inventory ON inventory;",
+        "CREATE TRIGGER trg_item_id_inventory BEFORE INSERT ON inventory FOR EACH ROW EXECUTE FUNCTION fill_item_id('name_en');",
+        """
+        CREATE OR REPLACE FUNCTION rename_item() RETURNS trigger AS $$
+        BEGIN
+            IF NEW.name_en IS DISTINCT FROM OLD.name_en THEN
+                UPDATE items SET name_en = NEW.name_en WHERE id = NEW.item_id AND name_en IS DISTINCT FROM NEW.name_en;
+                UPDATE inventory SET name_en = NEW.name_en WHERE item_id = NEW.item_id AND name_en IS DISTINCT FROM NEW.name_en;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        "DROP TRIGGER IF EXISTS trg_rename_item ON inventory;",
+        "CREATE TRIGGER trg_rename_item AFTER UPDATE OF name_en ON inventory FOR EACH ROW EXECUTE FUNCTION rename_item();",
+        # Uniqueness now comes from (item_id, location) and (region, item_id)
+        "ALTER TABLE inventory DROP CONSTRAINT IF EXISTS inventory_name_en_location_key;",
+        "DROP INDEX IF EXISTS idx_local_inv_uniq;",
+    ]),
+    (9, "Change-feed NOTIFY trigger on workers (read by the dashboard)", [
+        "DROP TRIGGER IF EXISTS trg_notify_workers ON workers;",
+        "CREATE TRIGGER trg_notify_workers AFTER INSERT OR UPDATE OR DELETE ON workers "
+        "FOR EACH STATEMENT EXECUTE FUNCTION notify_table_change();",
+    ]),
+    (10, "Delta sync keyed on the writing transaction id instead of last_updated", [
+        # A timestamp (or sequence value) is taken before commit, so a slow transaction can commit behind
+        # a reader's watermark. Readers instead keep the xmin of their snapshot: every transaction still
+        # running then has an xid >= xmin and is read again on the next sync (modules/inventory_store.py)
+        "ALTER TABLE inventory ADD COLUMN IF NOT EXISTS change_xid xid8 NOT NULL DEFAULT '0';",
+        "ALTER TABLE inventory_tombstones ADD COLUMN IF NOT EXISTS change_xid xid8 NOT NULL DEFAULT pg_current_xact_id();",
+        """
+        CREATE OR REPLACE FUNCTION touch_inventory() RETURNS trigger AS $$
+        BEGIN
+            NEW.last_updated := clock_timestamp();
+            NEW.change_xid := pg_current_xact_id();
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_inv_loc_xid ON inventory (location, change_xid);",
+        "CREATE INDEX IF NOT EXISTS idx_inv_tomb_loc_xid ON inventory_tombstones (location, change_xid);",
+        "DROP INDEX IF EXISTS idx_inv_loc_updated;",
+        "DROP INDEX IF EXISTS idx_inv_tomb_loc;",
+    ]),
+    (11, "Renames reach the item_name copies on requests, local_inventory and stock_reservations", [
+        # stock_logs keeps the name the item had when the movement was logged
+        """
+        CREATE OR REPLACE FUNCTION rename_item() RETURNS trigger AS $$
+        BEGIN
+            IF NEW.name_en IS DISTINCT FROM OLD.name_en THEN
+                UPDATE items SET name_en = NEW.name_en WHERE id = NEW.item_id AND name_en IS DISTINCT FROM NEW.name_en;
+                UPDATE inventory SET name_en = NEW.name_en WHERE item_id = NEW.item_id AND name_en IS DISTINCT FROM NEW.name_en;
+                UPDATE requests SET item_name = NEW.name_en WHERE item_id = NEW.item_id AND item_name IS DISTINCT FROM NEW.name_en;
+                UPDATE local_inventory SET item_name = NEW.name_en WHERE item_id = NEW.item_id AND item_name IS DISTINCT FROM NEW.name_en;
+                UPDATE stock_reservations SET item_name = NEW.name_en WHERE item_id = NEW.item_id AND item_name IS DISTINCT FROM NEW.name_en;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+    ] + [
+        # Copies left behind by renames made since migration 8
+        f"UPDATE {table} t SET item_name = it.name_en FROM items it WHERE it.id = t.item_id AND t.item_name IS DISTINCT FROM it.name_en;"
+        for table in ("requests", "local_inventory", "stock_reservations")
+    ]),
+    (12, "Change-feed payloads name the writing client (table@application_name)", [
+        # Only statements a client ran directly are tagged: the app process that ran them has already
+        # invalidated those tables and skips its own notification. Writes made by other triggers
+        # (e.g. a rename reaching requests) stay untagged, so every process applies them.
+        """
+        CREATE OR REPLACE FUNCTION notify_table_change() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('warehouse_changes', CASE
+                WHEN pg_trigger_depth() = 1 THEN TG_TABLE_NAME || '@' || COALESCE(current_setting('application_name', true), '')
+                ELSE TG_TABLE_NAME END);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+    ]),
+]
+
+HEAD = MIGRATIONS[-1][0]
+
+# Serialises migration runs across server processes/replicas sharing the database
+_ADVISORY_LOCK_ID = 727001
+
+_lock = threading.Lock()
+_at_head = False
+# duration_ms: one-time cost of the first check in this process; last_check_ms: cost of the latest rerun's check
+STATUS = {"version": None, "applied": [], "duration_ms": None, "checks": 0, "last_check_ms": None}
+
+def apply_migrations(session):
+    """Apply pending migrations inside the caller's transaction. Returns the list of applied versions."""
+    session.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": _ADVISORY_LOCK_ID})
+    session.execute(text("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT NOW()
+        );
+    """))
+    current = session.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_version")).scalar()
+    applied = []
+    for version, description, statements in MIGRATIONS:
+        if version <= current: continue
+        for stmt in statements:
+            session.execute(text(stmt))
+        session.execute(text("INSERT INTO schema_version (version, description) VALUES (:v, :d)"), {"v": version, "d": description})
+        applied.append(version)
+    return applied
+
+def migrate(conn):
+    """Bring the schema to HEAD once per process; later calls return immediately."""
+    global _at_head
+    start = time.perf_counter()
+    STATUS["checks"] += 1
+    if _at_head:
+        STATUS["last_check_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        return True
+    with _lock:
+        if _at_head: return True
+        try:
+            with conn.session as s:
+                applied = apply_migrations(s)
+                s.commit()
+        except Exception as e:
+            # Leave _at_head unset so the next rerun retries
+            print(f"[DB Migration] Failed: {e}")
+            return False
+        if applied: cache.clear()
+        elapsed = round((time.perf_counter() - start) * 1000, 1)
+        STATUS.update(version=HEAD, applied=applied, duration_ms=elapsed, last_check_ms=elapsed)
+        _at_head = True
+        print(f"[DB Migration] Schema at version {HEAD} (applied {applied or 'none'}) in {STATUS['duration_ms']} ms")
+        return True
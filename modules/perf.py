@@ -0,0 +1,162 @@
+import functools
+import re
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import streamlit as st
+
+# In-process query instrumentation.
+# run_query / run_action / run_bulk_action record one entry per statement into a ring buffer
+# that the manager "Performance" page aggregates into per-fingerprint latency percentiles.
+
+RING_SIZE = 5000
+DEFAULT_SLOW_QUERY_MS = 500
+
+_lock = threading.Lock()
+_records = deque(maxlen=RING_SIZE)
+_renders = deque(maxlen=RING_SIZE)
+_slow_ms = None
+# Render spans open on the current script thread (outer view fragment, nested fragments, ...)
+_local = threading.local()
+
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r"\b\d+(?:\.\d+)?\b")
+_SPACES = re.compile(r"\s+")
+
+def fingerprint(query):
+    """Normalised statement text: literals replaced by ?, whitespace collapsed."""
+    fp = _STRINGS.sub("?", str(query))
+    fp = _NUMBERS.sub("?", fp)
+    return _SPACES.sub(" ", fp).strip()
+
+def caller_view():
+    """Name of the nearest view function on the call stack (e.g. 'warehouse.storekeeper_view')."""
+    f = sys._getframe(2)
+    fallback = None
+    while f is not None:
+        mod = f.f_globals.get("__name__", "")
+        if mod.startswith("modules.views."):
+            return f"{mod.rsplit('.', 1)[-1]}.{f.f_code.co_name}"
+        if fallback is None and mod not in ("modules.database", "modules.perf") and mod.startswith("modules."):
+            fallback = f"{mod.rsplit('.', 1)[-1]}.{f.f_code.co_name}"
+        f = f.f_back
+    return fallback or "app"
+
+def slow_query_ms():
+    """Slow-query log threshold, read once from secrets ([performance] slow_query_ms)."""
+    global _slow_ms
+    if _slow_ms is None:
+        try:
+            _slow_ms = float(st.secrets.get("performance", {}).get("slow_query_ms", DEFAULT_SLOW_QUERY_MS))
+        except Exception:
+            _slow_ms = DEFAULT_SLOW_QUERY_MS
+    return _slow_ms
+
+def record(kind, query, seconds, rows=None, cache=None, error=None):
+    """Record one statement execution. kind: 'query' | 'action' | 'bulk'; cache: 'hit' | 'miss' | 'bypass' | 'store'."""
+    ms = seconds * 1000
+    entry = {
+        "ts": time.time(), "kind": kind, "fingerprint": fingerprint(query), "ms": ms,
+        "rows": rows, "cache": cache, "view": caller_view(), "error": error,
+    }
+    with _lock:
+        _records.append(entry)
+    for span in _spans():
+        span["query_s"] += seconds
+        span["queries"] += 1
+    if ms >= slow_query_ms():
+        print(f"[Slow Query] {ms:.0f} ms {kind} from {entry['view']} ({rows} rows, cache={cache}): {entry['fingerprint'][:300]}")
+
+def records():
+    import pandas as pd
+    with _lock:
+        return pd.DataFrame(list(_records))
+
+def summary():
+    """p50/p95 latency, call counts, cache hit rate and errors per statement fingerprint."""
+    df = records()
+    if df.empty: return df
+    df["hit"] = df["cache"] == "hit"
+    g = df.groupby(["fingerprint", "kind"])
+    out = g["ms"].agg(calls="count", p50=lambda s: s.quantile(0.5), p95=lambda s: s.quantile(0.95), max="max")
+    out["avg_rows"] = g["rows"].mean()
+    out["hit_rate"] = g["hit"].mean()
+    out["errors"] = g["error"].count()
+    out["views"] = g["view"].agg(lambda s: ", ".join(sorted(s.unique())))
+    return out.reset_index().sort_values("p95", ascending=False).round(2)
+
+# ---- Render timing ----
+# @timed_render on a view or fragment function records its wall time per rerun, split into
+# query time (statements recorded above while it runs), widget time (calls wrapped in
+# widget_time(), e.g. st.data_editor / st.dataframe / st.plotly_chart serialising a frame)
+# and the remaining Python time (pandas shaping, control flow). Nested spans include the time
+# of the fragments they call.
+
+def _spans():
+    return getattr(_local, "spans", ())
+
+def _role():
+    try:
+        return st.session_state.get("user_info", {}).get("role") or "anonymous"
+    except Exception:
+        return "unknown"
+
+def timed_render(fn):
+    """Decorator for view/fragment functions; apply it below @st.fragment."""
+    name = f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__name__}"
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        span = {"query_s": 0.0, "widget_s": 0.0, "queries": 0}
+        if not hasattr(_local, "spans"): _local.spans = []
+        _local.spans.append(span)
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            wall = time.perf_counter() - start
+            _local.spans.pop()
+            entry = {
+                "ts": time.time(), "view": name, "role": _role(), "wall_ms": wall * 1000,
+                "query_ms": span["query_s"] * 1000, "widget_ms": span["widget_s"] * 1000,
+                "python_ms": max(wall - span["query_s"] - span["widget_s"], 0) * 1000, "queries": span["queries"],
+            }
+            with _lock:
+                _renders.append(entry)
+    return wrapper
+
+@contextmanager
+def widget_time():
+    """Attribute the enclosed Streamlit element calls to widget time of the open render spans."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        for span in _spans():
+            span["widget_s"] += elapsed
+
+def widget(element):
+    """Wrap a Streamlit element function so its calls count as widget time: perf.widget(st.data_editor)(df, ...)."""
+    @functools.wraps(element)
+    def wrapper(*args, **kwargs):
+        with widget_time():
+            return element(*args, **kwargs)
+    return wrapper
+
+def render_records():
+    import pandas as pd
+    with _lock:
+        return pd.DataFrame(list(_renders), columns=["ts", "view", "role", "wall_ms", "query_ms", "widget_ms", "python_ms", "queries"])
+
+def render_summary():
+    """Per (view, role): rerun count, wall-time percentiles and the mean query / widget / Python split."""
+    df = render_records()
+    if df.empty: return df
+    g = df.groupby(["view", "role"])
+    out = g["wall_ms"].agg(renders="count", p50=lambda s: s.quantile(0.5), p95=lambda s: s.quantile(0.95))
+    for col in ("query_ms", "widget_ms", "python_ms", "queries"):
+        out[f"avg_{col}"] = g[col].mean()
+    return out.reset_index().sort_values("p95", ascending=False).round(2)
@@ -0,0 +1,68 @@
+import importlib
+import sys
+import threading
+import time
+
+# Cold-start profiling.
+# View modules (and the heavy libraries they pull in: pandas, plotly, openpyxl) are imported
+# on the first request for their route instead of when app.py starts. Each first import and
+# each route's first render in this process is timed once, printed as a [Startup] log line and
+# shown on the manager "Performance" page, so cold-start regressions are visible per deploy.
+
+# app.py imports this module first, so this is the start of the first script run in the process
+PROCESS_START = time.time()
+
+_lock = threading.Lock()
+_imports = {}   # module name -> {"ms", "at_s"}
+_renders = {}   # route -> {"ms", "at_s"}
+
+def _note(table, name, seconds, what):
+    with _lock:
+        if name in table: return
+        at = time.time() - PROCESS_START
+        table[name] = {"ms": round(seconds * 1000, 1), "at_s": round(at, 2)}
+    print(f"[Startup] {what} {name}: {seconds * 1000:.0f} ms ({at:.1f}s after start)")
+
+def load(module_name):
+    """Import module_name on first use, recording how long the first import took."""
+    # Always go through import_module: it waits if another session's thread is mid-import
+    loaded = module_name in sys.modules
+    start = time.perf_counter()
+    mod = importlib.import_module(module_name)
+    if not loaded:
+        _note(_imports, module_name, time.perf_counter() - start, "import")
+    return mod
+
+def view(module_name, func_name):
+    """Render function func_name from a lazily imported view module."""
+    return getattr(load(module_name), func_name)
+
+def mark(name, since=None):
+    """Record a one-off startup milestone (e.g. app imports done), timed from since or process start."""
+    _note(_renders, name, time.time() - (since if since is not None else PROCESS_START), "reached")
+
+def render(route, fn, *args):
+    """Call a route's render function; the first call per process is timed."""
+    if route in _renders: return fn(*args)
+    start = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        _note(_renders, route, time.perf_counter() - start, "first render")
+
+def prewarm(*module_names):
+    """Import modules on a background thread (e.g. pandas while the login form is shown)."""
+    pending = [m for m in module_names if m not in sys.modules]
+    if not pending: return
+    def _run():
+        for m in pending:
+            try: load(m)
+            except Exception as e: print(f"[Startup] Prewarm of {m} failed: {e}")
+    threading.Thread(target=_run, name="import-prewarm", daemon=True).start()
+
+def timings():
+    """(imports, renders) as lists of dicts ordered by time since process start."""
+    with _lock:
+        imports = [dict(name=k, **v) for k, v in _imports.items()]
+        renders = [dict(name=k, **v) for k, v in _renders.items()]
+    return sorted(imports, key=lambda r: r["at_s"]), sorted(renders, key=lambda r: r["at_s"])
@@ -1,42 +1,149 @@
 
+import importlib.util
+import re
+import tempfile
+import threading
+from collections import OrderedDict
 import streamlit as st
-import pandas as pd
-from io import BytesIO
+from io import BytesIO, TextIOWrapper
+from sqlalchemy import text
+from modules.database import get_connection
 
-def convert_df_to_excel(df, sheet_name="Sheet1"):
-    output = BytesIO()
-    # Create a copy to prevent modifying the original dataframe
-    df_export = df.copy()
-    
-    # Remove timezone information from datetime columns to prevent Excel errors
-    for col in df_export.columns:
-        # robustly convert datetime properties
-        is_datetime = pd.api.types.is_datetime64_any_dtype(df_export[col])
-        is_object = df_export[col].dtype == 'object'
-        
-        if is_object:
-            try:
-                # Attempt to convert object cols that might be datetimes
-                # We check the first non-null value
-                first_valid = df_export[col].dropna().iloc[0] if not df_export[col].dropna().empty else None
-                from datetime import datetime
-                if isinstance(first_valid, datetime):
-                     df_export[col] = pd.to_datetime(df_export[col])
-                     is_datetime = True
-            except:
-                pass
+EXPORT_FORMATS = {
+    "xlsx": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv": ("csv", "text/csv"),
+}
+# Parquet needs pyarrow, which is optional (not in requirements.txt); offer it only when installed
+if importlib.util.find_spec("pyarrow") is not None:
+    EXPORT_FORMATS["parquet"] = ("parquet", "application/vnd.apache.parquet")
+
+# Exports larger than this spill from memory to a temporary file while being written
+_SPOOL_BYTES = 8 * 1024 * 1024
 
-        if is_datetime:
+def strip_timezones(df):
+    """Make datetime columns timezone-naive (Excel rejects tz-aware values). Modifies df in place."""
+    import pandas as pd
+    for col in df.select_dtypes(include=["datetimetz"]).columns:
+        df[col] = df[col].dt.tz_localize(None)
+    for col in df.select_dtypes(include=["object"]).columns:
+        # Object columns holding datetime objects (e.g. mixed offsets from the driver)
+        if pd.api.types.infer_dtype(df[col], skipna=True) in ("datetime", "datetime64"):
             try:
-                if df_export[col].dt.tz is not None:
-                    df_export[col] = df_export[col].dt.tz_localize(None)
+                converted = pd.to_datetime(df[col])
+                df[col] = converted.dt.tz_localize(None) if converted.dt.tz is not None else converted
             except Exception:
                 pass
+    return df
 
+def convert_df_to_excel(df, sheet_name="Sheet1"):
+    return convert_dfs_to_excel({sheet_name: df})
+
+def convert_dfs_to_excel(sheets):
+    """One workbook with a sheet per {sheet_name: DataFrame} entry, written in a single pass."""
+    import pandas as pd
+    output = BytesIO()
     with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df_export.to_excel(writer, index=False, sheet_name=sheet_name)
+        for sheet_name, df in sheets.items():
+            # Create a copy to prevent modifying the original dataframe
+            df_export = strip_timezones(df.copy())
+            df_export.to_excel(writer, index=False, sheet_name=_sheet_title(sheet_name))
     return output.getvalue()
 
+def _sheet_title(name):
+    # Excel sheet names: max 31 chars, none of []:*?/\
+    return re.sub(r"[\[\]:*?/\\]", "_", str(name))[:31] or "Sheet1"
+
+# Built export files shared by all sessions, keyed by (export name, ..., data version).
+# A download is generated on first request and reused until the underlying tables change.
+MAX_CACHED_EXPORTS = 16
+_exports = OrderedDict()
+_exports_lock = threading.Lock()
+
+def peek_export(key):
+    """Previously built export for key, or None."""
+    with _exports_lock:
+        data = _exports.get(key)
+        if data is not None: _exports.move_to_end(key)
+        return data
+
+def cached_export(key, build):
+    """Return the export for key, calling build() only if it has not been built yet."""
+    data = peek_export(key)
+    if data is not None: return data
+    data = build()
+    if data is None: return None
+    with _exports_lock:
+        _exports[key] = data
+        while len(_exports) > MAX_CACHED_EXPORTS:
+            _exports.popitem(last=False)
+    return data
+
+def export_query(engine, query, params=None, fmt="xlsx", sheet_name="Sheet1", chunksize=5000):
+    """
+    Streams a query result into an export file without materialising the whole result.
+    Rows are read from a server-side cursor in chunks and appended to a write-only workbook
+    (or CSV / Parquet writer), so no DataFrame of the full result is ever built. Returns the
+    file bytes: the finished file itself is held in memory once, because st.download_button
+    serves downloads from memory.
+    """
+    import pandas as pd
+    out = tempfile.SpooledTemporaryFile(max_size=_SPOOL_BYTES)
+    with engine.connect().execution_options(stream_results=True, max_row_buffer=chunksize) as conn:
+        chunks = pd.read_sql(text(query), conn, params=params, chunksize=chunksize)
+        if fmt == "xlsx": _write_xlsx(chunks, out, sheet_name)
+        elif fmt == "csv": _write_csv(chunks, out)
+        elif fmt == "parquet" and fmt in EXPORT_FORMATS: _write_parquet(chunks, out)
+        else: raise ValueError(f"Unsupported export format: {fmt}")
+    out.seek(0)
+    return out.read()
+
+def _write_xlsx(chunks, out, sheet_name):
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(_sheet_title(sheet_name))
+    header = False
+    for chunk in chunks:
+        if not header:
+            ws.append(list(chunk.columns)); header = True
+        chunk = strip_timezones(chunk).astype(object)
+        for row in chunk.where(chunk.notna(), None).itertuples(index=False, name=None):
+            ws.append(row)
+    wb.save(out)
+
+def _write_csv(chunks, out):
+    text_out = TextIOWrapper(out, encoding="utf-8", newline="")
+    header = True
+    for chunk in chunks:
+        strip_timezones(chunk).to_csv(text_out, index=False, header=header)
+        header = False
+    text_out.flush()
+    text_out.detach()
+
+def _write_parquet(chunks, out):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export requires pyarrow")
+    writer = None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(strip_timezones(chunk), preserve_index=False)
+            if writer is None:
+                # A column with no values in the first chunk has type null; later chunks may fill it
+                schema = pa.schema([f.with_type(pa.string()) if pa.types.is_null(f.type) else f for f in table.schema],
+                                   metadata=table.schema.metadata)
+                writer = pq.ParquetWriter(out, schema)
+            writer.write_table(table.cast(writer.schema))
+    finally:
+        if writer is not None: writer.close()
+
+def stream_query_export(query, params=None, fmt="xlsx", sheet_name="Sheet1"):
+    """export_query over the app's database connection. Returns None if not connected."""
+    c = get_connection()
+    if not c: return None
+    return export_query(c.engine, query, params, fmt, sheet_name)
+
 def setup_styles():
     st.markdown("""
         <style>
@@ -1,28 +1,33 @@
 
 import streamlit as st
 import time
+from modules import perf
 from modules.inventory_logic import get_inventory, update_central_stock
-from modules.database import run_batch_action, get_connection
+from modules.database import run_bulk_action, get_connection, data_version
+from modules.change_feed import watch_seconds
+from modules.utils import EXPORT_FORMATS, stream_query_export, peek_export, cached_export
 from sqlalchemy import text
 
 @st.fragment
+@perf.timed_render
 def render_bulk_stock_take(location, user_name, key_prefix):
     inv = get_inventory(location)
     if inv.empty:
         st.info(f"No inventory found in {location}")
         return
 
-    df_view = inv[['name_en', 'category', 'qty', 'unit']].copy()
+    df_view = inv[['item_id', 'name_en', 'category', 'qty', 'unit']].copy()
     df_view.rename(columns={'qty': 'System Qty', 'name_en': 'Item Name'}, inplace=True)
     df_view['Physical Count'] = df_view['System Qty'] 
 
     st.markdown(f"### 📋 {location} Stock Take")
     
     with st.form(key=f"stock_form_{key_prefix}_{location}"):
-        edited_df = st.data_editor(
+        edited_df = perf.widget(st.data_editor)(
             df_view,
             key=f"stock_editor_{key_prefix}_{location}",
             column_config={
+                "item_id": None,
                 "Item Name": st.column_config.TextColumn(disabled=True),
                 "category": st.column_config.TextColumn(disabled=True),
                 "unit": st.column_config.TextColumn(disabled=True),
@@ -38,8 +43,9 @@ def render_bulk_stock_take(location, user_name, key_prefix):
         submitted = st.form_submit_button(f"💾 Update {location} Stock", width="stretch")
     
     if submitted:
-        # Collect all changes for batch processing (performance optimization)
-        batch_cmds = []
+        # Collect all changes for set-based processing (one executemany per statement)
+        inv_updates = []
+        log_rows = []
         changes_count = 0
         
         for index, row in edited_df.iterrows():
@@ -51,19 +57,16 @@ def render_bulk_stock_take(location, user_name, key_prefix):
                 unit = row['unit']
                 
                 # Update inventory
-                batch_cmds.append((
-                    "UPDATE inventory SET qty = qty + :diff, last_updated = NOW() WHERE name_en = :name AND location = :loc",
-                    {"diff": diff, "name": item_name, "loc": location}
-                ))
+                inv_updates.append({"diff": diff, "id": int(row['item_id']), "loc": location})
                 # Log the change
-                batch_cmds.append((
-                    "INSERT INTO stock_logs (log_date, action_by, action_type, item_name, location, change_amount, new_qty, unit) VALUES (NOW(), :u, 'Stock Take', :item, :loc, :diff, :nq, :unit)",
-                    {"u": user_name, "item": item_name, "loc": location, "diff": diff, "nq": phy_q, "unit": unit}
-                ))
+                log_rows.append({"u": user_name, "id": int(row['item_id']), "item": item_name, "loc": location, "diff": diff, "nq": phy_q, "unit": unit})
                 changes_count += 1
         
         if changes_count > 0:
-            if run_batch_action(batch_cmds):
+            if run_bulk_action([
+                ("UPDATE inventory SET qty = qty + :diff, last_updated = NOW() WHERE item_id = :id AND location = :loc", inv_updates),
+                ("INSERT INTO stock_logs (log_date, action_by, action_type, item_id, item_name, location, change_amount, new_qty, unit) VALUES (NOW(), :u, 'Stock Take', :id, :item, :loc, :diff, :nq, :unit)", log_rows),
+            ]):
                 st.toast(f"✅ Updated {changes_count} items in {location}!")
                 time.sleep(1); st.rerun()
             else:
@@ -71,3 +74,60 @@ def render_bulk_stock_take(location, user_name, key_prefix):
         else:
             st.info("No changes detected.")
 
+
+def render_lazy_download(label, build, file_name, key, tables, version_key=None):
+    """
+    Download button whose file is only built when the user asks for it.
+    The built file is shared across sessions and reused until one of `tables` is written.
+    version_key: anything else the content depends on (selected date, search term, ...).
+    """
+    export_key = (key, version_key, data_version(*tables))
+    data = peek_export(export_key)
+    if data is None and st.button(f"⚙️ Prepare {label}", key=f"prep_{key}"):
+        with st.spinner("Building export..."):
+            data = cached_export(export_key, build)
+    if data is not None:
+        st.download_button(f"📥 {label}", data, file_name, EXPORT_FORMATS["xlsx"][1], key=f"dl_{key}")
+
+@st.fragment
+@perf.timed_render
+def render_history_export(label, query, params, file_stem, key, tables):
+    """Full-history export streamed from the database in the chosen format, built only on request."""
+    c1, c2 = st.columns([1, 3])
+    fmt = c1.selectbox("Format", list(EXPORT_FORMATS), key=f"fmt_{key}", label_visibility="collapsed")
+    export_key = (key, fmt, repr(params), data_version(*tables))
+    data = peek_export(export_key)
+    if data is None and c2.button(f"⚙️ Prepare {label}", key=f"prep_{key}"):
+        with st.spinner("Building export..."):
+            data = cached_export(export_key, lambda: stream_query_export(query, params, fmt, file_stem))
+    if data is not None:
+        ext, mime = EXPORT_FORMATS[fmt]
+        c2.download_button(f"📥 Download {label} ({ext})", data, f"{file_stem}.{ext}", mime, key=f"dl_{key}")
+
+def watch_for_changes(key, version, editors=()):
+    """
+    Reruns the app when version() changes, e.g. a table written by another session or
+    reported by the change feed. Call it before reading the data it guards: the version
+    seen now is what this render shows, and the check itself never touches the database.
+    editors: key prefixes of the view's data editors. A rerun would discard their unsaved
+    edits, and edits inside a form stay in the browser until submit, so on such views a
+    change shows a notice with a refresh button instead of rerunning.
+    """
+    seen_key = f"watch_{key}"
+    st.session_state[seen_key] = version()
+
+    @st.fragment(run_every=watch_seconds())
+    def _watch():
+        if version() == st.session_state.get(seen_key):
+            return
+        if not editors:
+            st.rerun()
+        unsaved = any(_editor_has_edits(k) for k in list(st.session_state.keys()) if str(k).startswith(tuple(editors)))
+        st.info("🔄 Data changed since this page loaded." + (" You have unsaved edits." if unsaved else " Submit or discard your edits, then refresh."))
+        if st.button("Refresh now", key=f"{seen_key}_refresh"):
+            st.rerun()
+    _watch()
+
+def _editor_has_edits(key):
+    delta = st.session_state.get(key)
+    return isinstance(delta, dict) and any(delta.get(k) for k in ("edited_rows", "added_rows", "deleted_rows"))
@@ -1,47 +1,55 @@
 
 import streamlit as st
-import pandas as pd
 import plotly.express as px
-from modules.database import run_query
-from modules.config import AREAS
+from modules import change_feed, perf
+from modules.dashboard_logic import get_shared_snapshot, refresh_interval, snapshot_version
+from modules.views.common import watch_for_changes
 
-@st.fragment(run_every=30)  # Auto-refresh every 30 seconds
+REFRESH_SECONDS = refresh_interval()
+
+@st.fragment(run_every=REFRESH_SECONDS)  # Re-reads the shared in-memory snapshot; no per-session queries
+@perf.timed_render
 def manager_dashboard():
     st.header("📊 Executive Dashboard")
-    st.caption("🔄 Auto-refreshes every 30 seconds")
+    
+    # The refresher recomputes early on change-feed notifications; pick that up between timer ticks
+    watch_for_changes("dashboard", snapshot_version)
+    snap, age = get_shared_snapshot()
+    if snap is None:
+        st.warning("Dashboard data is unavailable right now.")
+        return
+    stale = age is not None and age > 2 * REFRESH_SECONDS
+    # Without the change feed, writes show up at the next timed refresh only
+    status = "⚠️ Stale" if stale else ("🔄 Live" if change_feed.is_live() else "🕒 Polling")
+    st.caption(f"{status} • updated {age:.0f}s ago • refreshes every {REFRESH_SECONDS} seconds")
     
     # --- Top Metrics Row ---
     col1, col2, col3, col4 = st.columns(4)
     
     # 1. Total Workers
-    workers = run_query("SELECT count(*) as count FROM workers WHERE status='Active'")
-    w_count = workers.iloc[0]['count'] if not workers.empty else 0
+    w_count = snap['active_workers']
     col1.metric("👷 Active Workers", w_count)
     
     # 2. Today's Attendance Rate
-    today = pd.Timestamp.now().strftime('%Y-%m-%d')
-    att = run_query("SELECT status FROM attendance WHERE date = :d", {"d": today})
-    if not att.empty:
-        present = len(att[att['status'] == 'Present'])
+    if snap['attendance_today'] > 0:
+        present = snap['present_today']
         rate = round((present / w_count * 100), 1) if w_count > 0 else 0
         col2.metric("✅ Attendance Rate", f"{rate}%", f"{present} / {w_count}")
     else:
         col2.metric("✅ Attendance Rate", "0%", "No Data Today")
 
     # 3. Pending Requests
-    reqs = run_query("SELECT count(*) as count FROM requests WHERE status='Pending'")
-    r_count = reqs.iloc[0]['count'] if not reqs.empty else 0
-    col3.metric("📝 Pending Requests", r_count)
+    col3.metric("📝 Pending Requests", snap['pending_requests'])
     
     # 4. Low Stock Alerts
-    low_stock = run_query("SELECT name_en, qty, location FROM inventory WHERE qty < 10 ORDER BY qty ASC")
-    ls_count = len(low_stock) if not low_stock.empty else 0
+    low_stock = snap['low_stock']
+    ls_count = len(low_stock)
     col4.metric("⚠️ Low Stock Items", ls_count)
     
     # Show low stock details if any
     if ls_count > 0:
         with st.expander(f"🚨 Low Stock Details ({ls_count} items)", expanded=True):
-            st.dataframe(low_stock, width="stretch", hide_index=True)
+            perf.widget(st.dataframe)(low_stock, width="stretch", hide_index=True)
     
     st.divider()
     
@@ -50,32 +58,25 @@ def manager_dashboard():
     
     with c1:
         st.subheader("👥 Workers by Region")
-        w_reg = run_query("SELECT region, count(*) as count FROM workers WHERE status='Active' GROUP BY region")
+        w_reg = snap['workers_by_region']
         if not w_reg.empty:
             fig = px.pie(w_reg, values='count', names='region', hole=0.4)
-            st.plotly_chart(fig, width="stretch")
+            perf.widget(st.plotly_chart)(fig, width="stretch")
         else: st.info("No worker data")
         
     with c2:
-        st.subheader("📦 Top 10 Stock Items (NSTC)")
-        stock = run_query("SELECT name_en as item, qty FROM inventory WHERE location='NSTC' ORDER BY qty DESC LIMIT 10")
+        st.subheader("📦 Top 10 Available Stock Items (NSTC)")
+        stock = snap['top_stock']
         if not stock.empty:
             fig = px.bar(stock, x='item', y='qty', color='qty', color_continuous_scale='Blues')
             fig.update_layout(xaxis_tickangle=-45)
-            st.plotly_chart(fig, width="stretch")
+            perf.widget(st.plotly_chart)(fig, width="stretch")
         else: st.info("No stock data")
 
     # --- Charts Row 2 ---
     st.subheader("📈 Attendance Trend (Last 7 Days)")
-    trend = run_query("""
-        SELECT date, count(*) as present_count 
-        FROM attendance 
-        WHERE status='Present' AND date >= CURRENT_DATE - INTERVAL '7 days' 
-        GROUP BY date 
-        ORDER BY date
-    """)
+    trend = snap['attendance_trend']
     if not trend.empty:
         fig_line = px.line(trend, x='date', y='present_count', markers=True)
-        st.plotly_chart(fig_line, width="stretch")
+        perf.widget(st.plotly_chart)(fig_line, width="stretch")
     else: st.info("No attendance history")
-
@@ -2,15 +2,22 @@
 import streamlit as st
 import pandas as pd
 import time
-from datetime import datetime
+from datetime import datetime, timedelta
+from modules import perf
 from modules.database import run_query, run_action, run_batch_action
 from modules.config import AREAS, ATTENDANCE_STATUSES
-from modules.utils import convert_df_to_excel
+from modules.manpower_logic import (
+    get_attendance_sheet, attendance_changes, save_attendance, save_worker_edits,
+    search_workers, count_workers, WORKER_PAGE_SIZE,
+)
+from modules.utils import convert_df_to_excel, convert_dfs_to_excel
+from modules.views.common import render_history_export, render_lazy_download
 
 # ==========================================
 # ============ MANAGER VIEW (MANPOWER) =====
 # ==========================================
 @st.fragment
+@perf.timed_render
 def manager_view_manpower():
     st.header("👷‍♂️ Manpower Project Management")
     tab1, tab2, tab3, tab4 = st.tabs(["📊 Reports", "👥 Worker Database", "⏰ Duty Roster / Shifts", "📍 Supervisors"])
@@ -18,32 +25,38 @@ def manager_view_manpower():
     with tab2: # Worker Database
         st.subheader("Manage Workers")
         
-        # Search box for workers
-        worker_search = st.text_input("🔍 Search Workers", placeholder="Search by name or employee ID...")
-        
-        # Optimization: Cache worker list for 10 seconds to avoid reload flicker but keep fresh enough
-        # Join with shifts to get simple name
-        workers = run_query("""
-            SELECT w.id, w.created_at, w.name, w.emp_id, w.role, w.region, w.status, w.shift_id, s.name as shift_name 
-            FROM workers w 
-            LEFT JOIN shifts s ON w.shift_id = s.id 
-            ORDER BY w.id DESC
-        """)
-        
-        # Filter by search term
-        if worker_search and not workers.empty:
-            workers = workers[
-                workers['name'].str.contains(worker_search, case=False, na=False) | 
-                workers['emp_id'].astype(str).str.contains(worker_search, case=False, na=False)
-            ]
+        shifts_ref = run_query("SELECT id, name FROM shifts")
+        shift_opts = {s['name']: s['id'] for i, s in shifts_ref.iterrows()} if not shifts_ref.empty else {}
+
+        # Search and filters run in the database (trigram indexes); the editor shows one page at a time
+        f1, f2, f3, f4 = st.columns([3, 2, 1, 1])
+        worker_search = f1.text_input("🔍 Search Workers", placeholder="Search by name or employee ID...")
+        f_region = f2.selectbox("Region", ["All"] + AREAS, key="worker_filter_region")
+        f_shift = f3.selectbox("Shift", ["All"] + list(shift_opts), key="worker_filter_shift")
+        f_status = f4.selectbox("Status", ["All", "Active", "Inactive"], key="worker_filter_status")
+        filters = {
+            "term": worker_search.strip() or None,
+            "region": None if f_region == "All" else f_region,
+            "shift_id": shift_opts.get(f_shift),
+            "status": None if f_status == "All" else f_status,
+        }
+
+        # Keyset paging: stack of "after id" cursors, restarted whenever the filters change
+        if st.session_state.get("worker_filters") != filters:
+            st.session_state.worker_filters = filters
+            st.session_state.worker_cursors = [None]
+        cursors = st.session_state.worker_cursors
+        workers, has_more = search_workers(**filters, after_id=cursors[-1])
+        total = count_workers(**filters)
         
         if not workers.empty:
-            excel_data = convert_df_to_excel(workers, "Workers")
-            st.download_button("📥 Export Worker List", excel_data, "workers_list.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+            render_lazy_download("Export Worker List", lambda: convert_df_to_excel(search_workers(**filters, page_size=None)[0], "Workers"),
+                                 "workers_list.xlsx", "workers_list", ["workers", "shifts"], version_key=repr(filters))
         
         # Add Worker
         with st.expander("➕ Add New Worker", expanded=True):
             @st.fragment
+            @perf.timed_render
             def render_add_worker_form():
                 with st.form("add_worker_form", clear_on_submit=True):
                     c1, c2, c3, c4, c5 = st.columns(5)
@@ -87,8 +100,9 @@ def manager_view_manpower():
             template_data = pd.DataFrame(columns=["Name", "EMP ID", "Role", "Region", "Shift"])
             
             @st.fragment
+            @perf.timed_render
             def render_bulk_worker_add(init_df, shift_options):
-                edited_bulk = st.data_editor(
+                edited_bulk = perf.widget(st.data_editor)(
                     init_df,
                     num_rows="dynamic",
                     key="bulk_worker_editor",
@@ -130,11 +144,12 @@ def manager_view_manpower():
             shift_names_list = list(shifts_lookup.keys())
 
             @st.fragment
-            def render_worker_edit(w_df, s_lookup, s_names_list):
+            @perf.timed_render
+            def render_worker_edit(w_df, s_lookup, s_names_list, page_key):
                 with st.form(key="worker_edit_form"):
-                    edited_w = st.data_editor(
+                    edited_w = perf.widget(st.data_editor)(
                         w_df,
-                        key="worker_editor",
+                        key=f"worker_editor_{page_key}",
                         column_config={
                             "id": st.column_config.NumberColumn(disabled=True),
                             "created_at": st.column_config.DatetimeColumn(disabled=True),
@@ -149,21 +164,25 @@ def manager_view_manpower():
                     submitted = st.form_submit_button("💾 Save Worker Changes", width="stretch")
                 
                 if submitted:
-                    changes = 0
-                    for index, row in edited_w.iterrows():
-                        # Basic validation
-                        eid = str(row['emp_id']) if row['emp_id'] else ""
-                        if eid and not eid.isdigit():
-                                st.error(f"Invalid EMP ID for {row['name']}: Numbers only."); continue
-                        
-                        # Resolve Shift ID
-                        new_sid = s_lookup.get(row['shift_name'])
-                        
-                        run_action("UPDATE workers SET name=:n, emp_id=:e, role=:r, region=:reg, status=:s, shift_id=:sid WHERE id=:id",
-                                   {"n":row['name'], "e":eid, "r":row['role'], "reg":row['region'], "s":row['status'], "sid":new_sid, "id":row['id']})
-                        changes += 1
-                    if changes > 0: st.success("Updated"); time.sleep(1); st.rerun()
-            render_worker_edit(workers, shifts_lookup, shift_names_list)
+                    # Only changed rows are written, all in one transaction; invalid rows are reported, not saved
+                    ok, changes, errors = save_worker_edits(w_df, edited_w, s_lookup)
+                    for err in errors: st.error(err)
+                    if not ok: st.error("Update failed.")
+                    elif changes > 0:
+                        st.success(f"Updated {changes} workers")
+                        if not errors: time.sleep(1); st.rerun()
+                    elif not errors: st.info("No changes detected.")
+            render_worker_edit(workers, shifts_lookup, shift_names_list, f"{abs(hash(repr(filters)))}_{cursors[-1]}")
+
+            pages = max(1, -(-total // WORKER_PAGE_SIZE))
+            p1, p2, p3 = st.columns([1, 3, 1])
+            p1.button("◀ Previous", disabled=len(cursors) == 1, width="stretch", key="worker_prev_page",
+                      on_click=lambda: st.session_state.worker_cursors.pop())
+            p2.caption(f"Page {len(cursors)} of {pages} • {total} matching workers")
+            p3.button("Next ▶", disabled=not has_more, width="stretch", key="worker_next_page",
+                      on_click=lambda last=int(workers['id'].iloc[-1]): st.session_state.worker_cursors.append(last))
+        elif total == 0:
+            st.info("No workers match the current filters.")
 
     with tab3: # Shifts
         st.subheader("⏰ Shift Management (Duty Roster)")
@@ -180,10 +199,10 @@ def manager_view_manpower():
                         s_str = ss.strftime("%H:%M")
                         e_str = se.strftime("%H:%M")
                         run_action("INSERT INTO shifts (name, start_time, end_time) VALUES (:n, :s, :e)", {"n":sn, "s":s_str, "e":e_str})
-                        st.success("Shift Added"); st.cache_data.clear(); st.rerun()
+                        st.success("Shift Added"); st.rerun()
 
         if not shifts.empty:
-            st.data_editor(shifts, key="shift_editor", disabled=["id"], hide_index=True, width="stretch")
+            perf.widget(st.data_editor)(shifts, key="shift_editor", disabled=["id"], hide_index=True, width="stretch")
             
     with tab4: # Supervisors
         st.subheader("📍 Supervisor Management")
@@ -227,10 +246,10 @@ def manager_view_manpower():
                         new_sid = s_opts.get(new_shift_name)
                         if run_action("UPDATE users SET region=:r, shift_id=:sid, role=:role WHERE username=:u", 
                                   {"r": new_reg_str, "sid":new_sid, "role":new_role, "u": selected_sup_u}):
-                            st.success(f"Updated {current_row['name']}"); st.cache_data.clear(); time.sleep(1); st.rerun()
+                            st.success(f"Updated {current_row['name']}"); time.sleep(1); st.rerun()
             
             st.divider()
-            st.dataframe(supervisors[['username', 'name', 'role', 'region']], width="stretch", hide_index=True)
+            perf.widget(st.dataframe)(supervisors[['username', 'name', 'role', 'region']], width="stretch", hide_index=True)
 
     with tab1: # Reports
         st.subheader("📊 Daily Attendance Report")
@@ -266,19 +285,34 @@ def manager_view_manpower():
                     with rtabs[i]:
                         st.caption(f"Attendance for {region}")
                         reg_df = df[df['region'] == region]
-                        st.dataframe(reg_df, width="stretch", hide_index=True)
-                        
-                        xl = convert_df_to_excel(reg_df, "Attendance")
-                        st.download_button(f"📥 Export {region} Report", xl, f"attendance_{region}_{report_date}.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", key=f"dl_{region}")
+                        perf.widget(st.dataframe)(reg_df, width="stretch", hide_index=True)
+                # One workbook with a sheet per region, built only when requested
+                render_lazy_download("Export Report (one sheet per region)",
+                                     lambda: convert_dfs_to_excel(dict(tuple(df.groupby('region', sort=False)))),
+                                     f"attendance_{report_date}.xlsx", "att_report", ["attendance", "workers", "shifts"], version_key=report_date)
             else:
-                 st.dataframe(df, width="stretch")
-                 xl = convert_df_to_excel(df, "Attendance")
-                 st.download_button("📥 Export Report", xl, f"attendance_{report_date}.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+                 perf.widget(st.dataframe)(df, width="stretch")
+                 render_lazy_download("Export Report", lambda: convert_df_to_excel(df, "Attendance"), f"attendance_{report_date}.xlsx",
+                                      "att_report", ["attendance", "workers", "shifts"], version_key=report_date)
+
+        with st.expander("📚 Attendance History Export"):
+            h1, h2 = st.columns(2)
+            h_from = h1.date_input("From", datetime.now() - timedelta(days=365), key="att_hist_from").strftime("%Y-%m-%d")
+            h_to = h2.date_input("To", datetime.now(), key="att_hist_to").strftime("%Y-%m-%d")
+            render_history_export("Attendance History", """
+                SELECT a.date, w.name, w.emp_id, w.region, w.role, a.status, s.name as shift, a.notes, a.supervisor
+                FROM attendance a
+                JOIN workers w ON a.worker_id = w.id
+                LEFT JOIN shifts s ON a.shift_id = s.id
+                WHERE a.date BETWEEN :f AND :t
+                ORDER BY a.date, w.region, w.name
+            """, {"f": h_from, "t": h_to}, f"attendance_{h_from}_{h_to}", "att_history", ["attendance", "workers", "shifts"])
 
 # ==========================================
 # ============ SUPERVISOR VIEW (MANPOWER) ==
 # ==========================================
 @st.fragment
+@perf.timed_render
 def supervisor_view_manpower():
     user = st.session_state.user_info
     my_regions = user['region'].split(",") if "," in user['region'] else [user['region']]
@@ -328,32 +362,17 @@ def supervisor_view_manpower():
 
         st.info(f"Supervisor Shift: **{my_shift_name}** → Taking Attendance for: **{target_shift_name}** Workers")
         
-        # 1. Get Workers in Region AND Target Shift
-        workers = run_query("SELECT id, name, role, status FROM workers WHERE region = :r AND shift_id = :sid AND status = 'Active' ORDER BY name", 
-                            params={"r": selected_region_mp, "sid": target_shift_id})
+        # Active workers in Region AND Target Shift, joined with what is already recorded for the date
+        df_att = get_attendance_sheet(selected_region_mp, target_shift_id, date_str)
         
-        if workers.empty:
+        if df_att.empty:
             st.info(f"No active workers found in {selected_region_mp} for {target_shift_name} Shift.")
         else:
-            # Fetch existing attendance for the SELECTED date and TARGET SHIFT
-            existing = run_query("SELECT worker_id, status, notes FROM attendance WHERE date = :d AND shift_id = :s", {"d": date_str, "s": target_shift_id})
-            
-            display_data = []
-            for i, w in workers.iterrows():
-                row = {"ID": w['id'], "Name": w['name'], "Role": w['role'], "Status": "Present", "Notes": ""}
-                if not existing.empty:
-                    match = existing[existing['worker_id'] == w['id']]
-                    if not match.empty:
-                        row['Status'] = match.iloc[0]['status']
-                        row['Notes'] = match.iloc[0]['notes']
-                display_data.append(row)
-            
-            df_att = pd.DataFrame(display_data)
-            
             @st.fragment
+            @perf.timed_render
             def render_attendance_form(df_to_edit):
                 with st.form("attendance_form"):
-                    edited_att = st.data_editor(
+                    edited_att = perf.widget(st.data_editor)(
                         df_to_edit,
                         # Key must change if shift changes to avoid stale data
                         key=f"att_editor_{selected_region_mp}_{target_shift_id}",
@@ -363,25 +382,21 @@ def supervisor_view_manpower():
                             "Role": st.column_config.TextColumn(disabled=True),
                             "Status": st.column_config.SelectboxColumn(
                                 options=ATTENDANCE_STATUSES, required=True),
-                            "Notes": st.column_config.TextColumn()
+                            "Notes": st.column_config.TextColumn(),
+                            "Recorded": None
                         },
                         hide_index=True, width="stretch"
                     )
                     
                     if st.form_submit_button("💾 Submit Attendance"):
-                        batch_cmds = []
-                        for i, row in edited_att.iterrows():
-                            # 1. Delete Existing using TARGET SHIFT ID (where the record belongs)
-                            batch_cmds.append(("DELETE FROM attendance WHERE worker_id=:wid AND date=:d AND shift_id=:sid", 
-                                               {"wid": row['ID'], "d": date_str, "sid": target_shift_id}))
-                            # 2. Insert New
-                            batch_cmds.append(("INSERT INTO attendance (worker_id, date, shift_id, status, notes, supervisor) VALUES (:wid, :d, :sid, :s, :n, :sup)",
-                                               {"wid": row['ID'], "d": date_str, "sid": target_shift_id, "s": row['Status'], "n": row['Notes'], "sup": user['name']}))
-                        
-                        if run_batch_action(batch_cmds):
-                            st.toast(f"Attendance recorded for {len(edited_att)} workers on {date_str}!", icon="✅")
+                        # Only new or edited rows are written, upserted under the TARGET SHIFT ID (where the record belongs)
+                        changes = attendance_changes(df_to_edit, edited_att)
+                        if changes.empty:
+                            st.info("No changes to save.")
+                        elif save_attendance(changes, date_str, target_shift_id, user['name']):
+                            st.toast(f"Attendance recorded for {len(changes)} workers on {date_str}!", icon="✅")
                             time.sleep(1); st.rerun()
             render_attendance_form(df_att)
 
     with tab2:
-        st.dataframe(run_query("SELECT * FROM workers WHERE region = :r", {"r": selected_region_mp}), width="stretch")
+        perf.widget(st.dataframe)(run_query("SELECT * FROM workers WHERE region = :r", {"r": selected_region_mp}), width="stretch")
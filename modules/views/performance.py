@@ -0,0 +1,105 @@
+import streamlit as st
+import pandas as pd
+from modules import auth, cache, inventory_store, migrations, perf, startup
+
+# ==========================================
+# ============ MANAGER VIEW (PERF) =========
+# ==========================================
+@st.fragment
+def manager_performance():
+    st.header("⏱️ Performance")
+    threshold = perf.slow_query_ms()
+    st.caption(f"In-process statistics since the last server restart • slow-query threshold: {threshold:.0f} ms")
+
+    latency_tab, render_tab, slow_tab, cache_tab, login_tab, startup_tab = st.tabs(["🐢 Query Latency", "🧩 Render Timing", "📜 Slow Query Log", "🗄️ Cache", "🔐 Login Pool", "🚀 Cold Start"])
+
+    with latency_tab:
+        summary = perf.summary()
+        if summary.empty:
+            st.info("No queries recorded yet.")
+        else:
+            c1, c2, c3 = st.columns(3)
+            c1.metric("Statements", int(summary['calls'].sum()))
+            c2.metric("Fingerprints", len(summary))
+            c3.metric("Errors", int(summary['errors'].sum()))
+            st.dataframe(
+                summary,
+                column_config={
+                    "fingerprint": st.column_config.TextColumn("Statement", width="large"),
+                    "p50": st.column_config.NumberColumn("p50 (ms)"),
+                    "p95": st.column_config.NumberColumn("p95 (ms)"),
+                    "max": st.column_config.NumberColumn("max (ms)"),
+                    "hit_rate": st.column_config.ProgressColumn("Cache hit rate", min_value=0, max_value=1),
+                },
+                width="stretch", hide_index=True
+            )
+
+    with render_tab:
+        renders = perf.render_summary()
+        if renders.empty:
+            st.info("No view renders recorded yet.")
+        else:
+            st.caption("Wall time per rerun split into database queries, Streamlit element serialisation (tables, editors, charts) and remaining Python work.")
+            role = st.selectbox("Role", ["All"] + sorted(renders['role'].unique()), key="perf_render_role")
+            shown = renders if role == "All" else renders[renders['role'] == role]
+            st.dataframe(
+                shown,
+                column_config={
+                    "p50": st.column_config.NumberColumn("p50 wall (ms)"),
+                    "p95": st.column_config.NumberColumn("p95 wall (ms)"),
+                },
+                width="stretch", hide_index=True
+            )
+            raw = perf.render_records()
+            c1, c2 = st.columns(2)
+            c1.download_button("📥 Raw renders (CSV)", raw.to_csv(index=False), "render_timing.csv", "text/csv", width="stretch")
+            c2.download_button("📥 Raw renders (JSON)", raw.to_json(orient="records"), "render_timing.json", "application/json", width="stretch")
+
+    with slow_tab:
+        recs = perf.records()
+        slow = recs[recs['ms'] >= threshold].copy() if not recs.empty else pd.DataFrame()
+        if slow.empty:
+            st.info("No slow queries recorded.")
+        else:
+            slow['ts'] = pd.to_datetime(slow['ts'], unit='s')
+            st.dataframe(slow.sort_values('ts', ascending=False).round({'ms': 1}), width="stretch", hide_index=True)
+
+    with cache_tab:
+        stats = cache.stats()
+        if not stats:
+            st.info("Cache is empty.")
+        else:
+            st.dataframe(pd.DataFrame.from_dict(stats, orient='index').rename_axis('table').reset_index(), width="stretch", hide_index=True)
+        store = inventory_store.stats()
+        if store:
+            st.markdown("**Inventory store** (delta sync per location)")
+            st.dataframe(pd.DataFrame(store), width="stretch", hide_index=True)
+        status = migrations.STATUS
+        st.caption(f"Schema version {status['version']} • migration check took {status['duration_ms']} ms at startup, "
+                   f"{status['last_check_ms']} ms on the last rerun ({status['checks']} checks)")
+
+    with login_tab:
+        pool = auth.pool_stats()
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Queue depth", pool['depth'], f"max {pool['max_depth']}", delta_color="off")
+        c2.metric("Jobs", pool['completed'])
+        c3.metric("Rejected (busy)", pool['rejected'], f"{pool['timed_out']} timed out", delta_color="off")
+        c4.metric("Throttled keys", auth.throttled_count())
+        recs = perf.records()
+        recs = recs[recs['kind'] == 'auth'] if not recs.empty else recs
+        if recs.empty:
+            st.info("No password checks recorded yet.")
+        else:
+            lat = recs.groupby('fingerprint')['ms'].agg(calls="count", p50=lambda s: s.quantile(0.5), p95=lambda s: s.quantile(0.95), max="max")
+            st.dataframe(lat.round(1).reset_index().rename(columns={'fingerprint': 'step'}), width="stretch", hide_index=True)
+
+    with startup_tab:
+        imports, renders = startup.timings()
+        st.caption("First import / first render per module in this server process (at_s: seconds after the first script run)")
+        c1, c2 = st.columns(2)
+        with c1:
+            st.markdown("**Imports**")
+            st.dataframe(pd.DataFrame(imports, columns=["name", "ms", "at_s"]), width="stretch", hide_index=True)
+        with c2:
+            st.markdown("**First renders**")
+            st.dataframe(pd.DataFrame(renders, columns=["name", "ms", "at_s"]), width="stretch", hide_index=True)
@@ -2,19 +2,22 @@
 import streamlit as st
 import pandas as pd
 import time
-from modules.database import run_query, run_action, run_batch_action
+from modules import perf
+from modules.database import run_query, run_action, run_batch_action, run_bulk_action, data_version
 from modules.config import TEXT as txt, CATS_EN, LOCATIONS, EXTERNAL_PROJECTS, AREAS
-from modules.utils import convert_df_to_excel
+from modules.utils import convert_df_to_excel, convert_dfs_to_excel
 from modules.inventory_logic import (
     get_inventory, update_central_stock, get_local_inventory_by_item, 
-    update_local_inventory, update_request_details, delete_request, transfer_stock
+    update_local_inventory, update_request_details, delete_request, transfer_stock_batch,
+    stock_position, allocate_requests, allocation_summary, issue_requests_batch, approve_requests_batch
 )
-from modules.views.common import render_bulk_stock_take
+from modules.views.common import render_bulk_stock_take, render_history_export, render_lazy_download, watch_for_changes
 
 # ==========================================
 # ============ MANAGER VIEW (WH) ===========
 # ==========================================
 @st.fragment
+@perf.timed_render
 def manager_view_warehouse():
     st.header(txt['manager_role'])
     view_option = st.radio("Navigate", ["📦 Stock Management", txt['ext_tab'], "⏳ Bulk Review", txt['local_inv'], "📜 Logs", "🔍 Audit"], horizontal=True, label_visibility="collapsed")
@@ -49,7 +52,7 @@ def manager_view_warehouse():
                 transfer_df['Transfer Qty'] = 0
 
                 with st.form("internal_transfer_form"):
-                    edited_transfer = st.data_editor(
+                    edited_transfer = perf.widget(st.data_editor)(
                         transfer_df,
                         key="transfer_editor_snc_nstc",
                         column_config={
@@ -69,30 +72,20 @@ def manager_view_warehouse():
                         if items_to_transfer.empty:
                             st.warning("Please enter quantity for at least one item.")
                         else:
-                            success_count = 0
-                            fail_count = 0
+                            # All lines move in one transaction: either every line applies or none does
+                            lines = [(row['Item Name'], int(row['Transfer Qty']), row['unit']) for _, row in items_to_transfer.iterrows()]
+                            res, results = transfer_stock_batch(lines, st.session_state.user_info['name'])
                             
-                            for index, row in items_to_transfer.iterrows():
-                                t_item = row['Item Name']
-                                t_qty = int(row['Transfer Qty'])
-                                avail_qty = int(row['Available Qty'])
-                                unit = row['unit']
-                                
-                                if t_qty <= avail_qty:
-                                    res, msg = transfer_stock(t_item, t_qty, st.session_state.user_info['name'], unit)
-                                    if res: success_count += 1
-                                    else: fail_count += 1
-                                else:
-                                    st.error(f"❌ '{t_item}': Request {t_qty} > Available {avail_qty}")
-                                    fail_count += 1
-                            
-                            if success_count > 0:
+                            if res:
                                 st.balloons()
-                                st.success(f"Successfully transferred {success_count} items!")
+                                st.success(f"Successfully transferred {len(results)} items!")
                                 time.sleep(1)
                                 st.rerun()
-                            if fail_count > 0:
-                                st.warning(f"Failed to transfer {fail_count} items. Check errors above.")
+                            else:
+                                for r in results:
+                                    if r['msg'].startswith("Rolled back"): continue
+                                    st.error(f"❌ '{r['item']}': {r['msg']}")
+                                st.warning("No items were transferred. Fix the lines above and try again.")
             else:
                 st.info("SNC Inventory is empty.")
 
@@ -124,7 +117,7 @@ def manager_view_warehouse():
                                 row = item_rows.iloc[0]
                                 change = -int(amt) if "Lend" in op else int(amt)
                                 desc = f"Lend to {proj}" if "Lend" in op else f"Borrow from {proj}"
-                                res, msg = update_central_stock(it, wh, change, st.session_state.user_info['name'], desc, row['unit'])
+                                res, msg = update_central_stock(it, wh, change, st.session_state.user_info['name'], desc, row['unit'], int(row['item_id']))
                                 if res: 
                                     st.toast("Transaction Successful!", icon="🎉")
                                     st.rerun()
@@ -148,7 +141,7 @@ def manager_view_warehouse():
                             item_rows = inv[inv['name_en']==it]
                             if not item_rows.empty:
                                 row = item_rows.iloc[0]
-                                res, msg = update_central_stock(it, dest, amt, st.session_state.user_info['name'], "From CWW", row['unit'])
+                                res, msg = update_central_stock(it, dest, amt, st.session_state.user_info['name'], "From CWW", row['unit'], int(row['item_id']))
                                 if res: st.success("Done"); st.rerun()
                                 else: st.error(msg)
                             else: st.error("Item selection invalid.")
@@ -158,16 +151,34 @@ def manager_view_warehouse():
         st.divider()
         loan_logs = run_query("SELECT log_date, item_name, change_amount, location, action_type FROM stock_logs WHERE action_type LIKE '%Lend%' OR action_type LIKE '%Borrow%' ORDER BY log_date DESC")
         if not loan_logs.empty: 
-            st.dataframe(loan_logs, width="stretch")
-            st.download_button("📥 Export Loan Logs", convert_df_to_excel(loan_logs, "Loans"), "loan_logs.xlsx")
+            perf.widget(st.dataframe)(loan_logs, width="stretch")
+            render_lazy_download("Export Loan Logs", lambda: convert_df_to_excel(loan_logs, "Loans"), "loan_logs.xlsx", "loan_logs", ["stock_logs"])
 
     elif view_option == "⏳ Bulk Review": # Requests
-        # Cache this query for 10s to avoid instant flicker but reduce load
-        reqs = run_query("SELECT req_id, request_date, region, supervisor_name, item_name, qty, unit, notes FROM requests WHERE status='Pending' ORDER BY region, request_date DESC")
+        # Flag changes to requests or stock made elsewhere; the manager refreshes when their edits are done
+        watch_for_changes("mgr_bulk_review", lambda: data_version("requests", "inventory"), editors=("editor_",))
+        reqs = run_query("SELECT req_id, request_date, region, supervisor_name, item_id, item_name, qty, unit, notes FROM requests WHERE status='Pending' ORDER BY region, request_date DESC")
 
         # Nested fragment to isolate rerun scope
         @st.fragment
+        @perf.timed_render
         def render_manager_bulk_review(requests_df):
+            # Suggested allocation of live NSTC stock across ALL pending requests, oldest first
+            position = stock_position(requests_df['item_id'].unique())
+            suggested = allocate_requests(requests_df, position)
+            covered = suggested.set_index('req_id')['allocated']
+            summary = allocation_summary(suggested, position)
+            short_items = int((summary['short'] > 0).sum())
+            with st.expander(f"📦 NSTC Allocation • {short_items} items short", expanded=short_items > 0):
+                perf.widget(st.dataframe)(
+                    summary.sort_values(['short', 'item_name'], ascending=[False, True]),
+                    column_config={
+                        "item_name": "Item", "on_hand": "On Hand", "reserved": "Reserved (approved, not issued)",
+                        "requested": "Pending Requested", "allocated": "Allocatable", "atp": "Available to Promise", "short": "Short",
+                    },
+                    hide_index=True, width="stretch"
+                )
+
             regions = requests_df['region'].unique()
             region_tabs = st.tabs(list(regions))
             for i, region in enumerate(regions):
@@ -181,10 +192,11 @@ def manager_view_warehouse():
                     
                     reg_df['Mgr Qty'] = reg_df['qty']
                     reg_df['Mgr Note'] = reg_df['notes']
-                    display_df = reg_df[['req_id', 'item_name', 'supervisor_name', 'qty', 'unit', 'Mgr Qty', 'Mgr Note', 'Action']]
+                    reg_df['Stock'] = reg_df['req_id'].map(covered).map({True: "✅ Covered", False: "⚠️ Short"})
+                    display_df = reg_df[['req_id', 'item_name', 'supervisor_name', 'qty', 'unit', 'Stock', 'Mgr Qty', 'Mgr Note', 'Action']]
                     
                     with st.form(key=f"mgr_form_{region}"):
-                        edited_df = st.data_editor(
+                        edited_df = perf.widget(st.data_editor)(
                             display_df,
                             key=f"editor_{region}",
                             column_config={
@@ -192,6 +204,7 @@ def manager_view_warehouse():
                                 "supervisor_name": st.column_config.TextColumn(disabled=True),
                                 "qty": st.column_config.NumberColumn(disabled=True, label="Req Qty"),
                                 "unit": st.column_config.TextColumn(disabled=True),
+                                "Stock": st.column_config.TextColumn(disabled=True, help="Suggested allocation, oldest requests first"),
                                 "Mgr Qty": st.column_config.NumberColumn(min_value=1, max_value=10000, required=True),
                                 "Action": st.column_config.SelectboxColumn(options=["Keep Pending", "Approve", "Reject"], required=True)
                             },
@@ -199,46 +212,27 @@ def manager_view_warehouse():
                         )
                         
                         if st.form_submit_button(f"Process Updates for {region}"):
-                            batch_cmds = []
-                            count_changes = 0
-                            
-                            # Pre-fetch inventory to avoid queries in loop
-                            inv_items = edited_df['item_name'].unique().tolist()
-                            if inv_items:
-                                stock_data = run_query("SELECT name_en, qty FROM inventory WHERE location='NSTC'")
-                                stock_map = {row['name_en']: row['qty'] for _, row in stock_data.iterrows()}
-                            else:
-                                stock_map = {}
-
+                            approvals, rejections = [], []
                             for index, row in edited_df.iterrows():
-                                rid = row['req_id']
-                                action = row['Action']
-                                new_q = int(row['Mgr Qty'])
                                 new_n = row['Mgr Note']
-                                
-                                if action == "Approve":
-                                    avail = stock_map.get(row['item_name'], 0)
-                                    if avail >= new_q:
-                                        final_note = f"Manager: {new_n}" if new_n else ""
-                                        batch_cmds.append((
-                                            "UPDATE requests SET status='Approved', qty=:q, notes=:n WHERE req_id=:id",
-                                            {"q":new_q, "n":final_note, "id":rid}
-                                        ))
-                                        count_changes += 1
-                                    else: 
-                                        st.toast(f"❌ Low Stock for {row['item_name']}. Skipped.", icon="⚠️")
-                                elif action == "Reject":
-                                    batch_cmds.append((
-                                        "UPDATE requests SET status='Rejected', notes=:n WHERE req_id=:id",
-                                        {"n":new_n, "id":rid}
-                                    ))
-                                    count_changes += 1
+                                if row['Action'] == "Approve":
+                                    approvals.append((int(row['req_id']), int(row['Mgr Qty']), f"Manager: {new_n}" if new_n else ""))
+                                elif row['Action'] == "Reject":
+                                    rejections.append((int(row['req_id']), new_n))
                             
-                            if batch_cmds:
-                                if run_batch_action(batch_cmds):
-                                    st.success(f"Processed {count_changes} requests!"); time.sleep(1); st.rerun()
+                            if approvals or rejections:
+                                # Availability is re-checked in the approving statement, oldest requests of every region first
+                                ok, results = approve_requests_batch(approvals, rejections)
+                                names = reg_df.set_index('req_id')['item_name']
+                                for r in results:
+                                    if not r['ok']: st.toast(f"❌ {names.get(r['req_id'], r['req_id'])}: {r['msg']}. Skipped.", icon="⚠️")
+                                done = len(rejections) + sum(r['ok'] for r in results)
+                                if ok:
+                                    st.success(f"Processed {done} requests!"); time.sleep(1); st.rerun()
+                                elif done:
+                                    st.warning(f"Processed {done} requests; {len(results) - sum(r['ok'] for r in results)} approvals skipped.")
                                 else:
-                                    st.error("Failed to process changes. Please try again.")
+                                    st.error("No changes were applied.")
     
         if reqs.empty: st.info("No pending requests")
         else: render_manager_bulk_review(reqs)
@@ -246,23 +240,29 @@ def manager_view_warehouse():
     elif view_option == txt['local_inv']: # Local Inventory
         st.subheader("📊 Branch Inventory (By Area)")
         # Optimization: Fetch ALL local inventory in one query
-        all_local = run_query("SELECT region, item_name, qty, last_updated, updated_by FROM local_inventory ORDER BY region, item_name")
+        all_local = run_query("SELECT l.region, i.name_en AS item_name, l.qty, l.last_updated, l.updated_by FROM local_inventory l JOIN items i ON i.id = l.item_id ORDER BY l.region, i.name_en")
+        by_area = dict(tuple(all_local.groupby('region', sort=False))) if not all_local.empty else {}
+        
+        # One workbook, one sheet per area, built from the frame already fetched (only when requested)
+        if by_area:
+            render_lazy_download("Export All Areas (one sheet per area)", lambda: convert_dfs_to_excel(by_area),
+                                 "branch_inventory_all_areas.xlsx", "local_inv_all", ["local_inventory"])
         
         m_tabs = st.tabs(AREAS)
         for i, area in enumerate(AREAS):
             with m_tabs[i]:
-                df = all_local[all_local['region'] == area] if not all_local.empty else pd.DataFrame()
+                df = by_area.get(area, pd.DataFrame())
                 if df.empty:
                     st.info(f"No inventory record for {area}")
                 else:
-                    st.dataframe(df, width="stretch")
-                    st.download_button(f"📥 Export {area} Inv", convert_df_to_excel(df, area), f"{area}_inv.xlsx", key=f"dl_loc_{area}")
+                    perf.widget(st.dataframe)(df, width="stretch")
 
     elif view_option == "📜 Logs": # Logs
         logs = run_query("SELECT * FROM stock_logs ORDER BY log_date DESC LIMIT 500")
-        st.dataframe(logs, width="stretch")
+        perf.widget(st.dataframe)(logs, width="stretch")
         if not logs.empty:
-            st.download_button("📥 Export Stock Logs", convert_df_to_excel(logs, "StockLogs"), "stock_logs.xlsx")
+            render_lazy_download("Export Stock Logs", lambda: convert_df_to_excel(logs, "StockLogs"), "stock_logs.xlsx", "stock_logs", ["stock_logs"])
+        render_history_export("Full Stock Log History", "SELECT * FROM stock_logs ORDER BY log_date DESC", None, "stock_logs_full", "stock_logs_full", ["stock_logs"])
 
     elif view_option == "🔍 Audit": # Audit Log
         st.subheader("🔍 Audit Log")
@@ -270,8 +270,8 @@ def manager_view_warehouse():
         
         audit_logs = run_query("SELECT timestamp, user_name, action, details, module FROM audit_logs ORDER BY timestamp DESC LIMIT 200")
         if not audit_logs.empty:
-            st.dataframe(audit_logs, width="stretch", hide_index=True)
-            st.download_button("📥 Export Log", convert_df_to_excel(audit_logs, "AuditLog"), "audit_log.xlsx")
+            perf.widget(st.dataframe)(audit_logs, width="stretch", hide_index=True)
+            render_lazy_download("Export Log", lambda: convert_df_to_excel(audit_logs, "AuditLog"), "audit_log.xlsx", "audit_log", ["audit_logs"])
         else:
             st.info("No audit records yet")
 
@@ -279,16 +279,20 @@ def manager_view_warehouse():
 # ============ STOREKEEPER VIEW ============
 # ==========================================
 @st.fragment
+@perf.timed_render
 def storekeeper_view():
     st.header(txt['storekeeper_role'])
     st.caption("Manage requests and inventory")
     view_option = st.radio("Navigate", [txt['approved_reqs'], "📋 Issued Today", "NSTC Stock Take", "SNC Stock Take"], horizontal=True, label_visibility="collapsed")
     
     if view_option == txt['approved_reqs']: # Bulk Issue
+        # New approvals are flagged without a manual reload; in-progress issue edits are kept
+        watch_for_changes("sk_pending_issue", lambda: data_version("requests"), editors=("sk_editor_",))
         # Optimized Query: Select only needed columns
         reqs = run_query("SELECT req_id, region, item_name, qty, unit, notes, status FROM requests WHERE status='Approved'")
         
         @st.fragment
+        @perf.timed_render
         def render_storekeeper_bulk_issue(reqs_df):
             regions = reqs_df['region'].unique()
             if len(regions) > 0:
@@ -304,7 +308,7 @@ def storekeeper_view():
                         display_sk = sk_df[['req_id', 'item_name', 'qty', 'unit', 'notes', 'Final Issue Qty', 'SK Note', 'Ready to Issue']]
                         
                         with st.form(key=f"sk_form_{region}"):
-                            edited_sk = st.data_editor(
+                            edited_sk = perf.widget(st.data_editor)(
                                 display_sk,
                                 key=f"sk_editor_{region}",
                                 column_config={
@@ -317,40 +321,29 @@ def storekeeper_view():
                                 },
                                 hide_index=True, width="stretch"
                             )
+                            skip_short = st.checkbox("Issue what is in stock (skip short items)", key=f"sk_partial_{region}")
                             if st.form_submit_button(f"Confirm Bulk Issue for {region}"):
-                                batch_cmds = []
-                                issued_count = 0
-                                
+                                lines = []
                                 for index, row in edited_sk.iterrows():
                                     if row['Ready to Issue']:
-                                        rid = row['req_id']
-                                        iq = int(row['Final Issue Qty'])
                                         sn = row['SK Note']
                                         existing_note = row['notes'] if row['notes'] else ""
                                         final_note = f"{existing_note} | SK: {sn}" if sn else existing_note
-                                        item = row['item_name']
-                                        unit = row['unit']
+                                        lines.append((int(row['req_id']), row['item_name'], int(row['Final Issue Qty']), row['unit'], region, final_note))
                                         
-                                        batch_cmds.append((
-                                            "UPDATE inventory SET qty = qty - :q, last_updated=NOW() WHERE name_en=:n AND location='NSTC'",
-                                            {"q": iq, "n": item}
-                                        ))
-                                        batch_cmds.append((
-                                            "INSERT INTO stock_logs (log_date, action_by, action_type, item_name, location, change_amount, new_qty, unit) VALUES (NOW(), :u, :t, :n, 'NSTC', :c, (SELECT qty FROM inventory WHERE name_en=:n AND location='NSTC') - :q, :un)",
-                                            {"n": item, "c": -iq, "u": st.session_state.user_info['name'], "t": f"Issued {region}", "un": unit, "q": iq}
-                                        ))
-                                        
-                                        batch_cmds.append((
-                                            "UPDATE requests SET status='Issued', qty=:q, notes=:n WHERE req_id=:id",
-                                            {"q":iq, "n":final_note, "id":rid}
-                                        ))
-                                        issued_count += 1
-                                        
-                                if issued_count > 0:
-                                    if run_batch_action(batch_cmds):
-                                        st.success(f"Issued {issued_count} items!"); time.sleep(1); st.rerun()
+                                if lines:
+                                    # One transaction: stock is taken per item, nothing goes negative
+                                    ok, results = issue_requests_batch(lines, st.session_state.user_info['name'], partial=skip_short)
+                                    issued = [r for r in results if r['ok']]
+                                    for r in results:
+                                        if not r['ok'] and not r['msg'].startswith("Rolled back"):
+                                            st.error(f"❌ #{r['req_id']} '{r['item']}': {r['msg']}")
+                                    if ok:
+                                        st.success(f"Issued {len(issued)} items!"); time.sleep(1); st.rerun()
+                                    elif issued:
+                                        st.warning(f"Issued {len(issued)} of {len(results)} items.")
                                     else:
-                                        st.error("Transaction failed.")
+                                        st.warning("Nothing was issued. Fix the lines above or tick 'Issue what is in stock'.")
         
         if reqs.empty: st.info("No tasks")
         else: render_storekeeper_bulk_issue(reqs)
@@ -359,7 +352,7 @@ def storekeeper_view():
         st.subheader("📋 Items Issued Today")
         today_log = run_query("""SELECT item_name, qty, unit, region, supervisor_name, notes, request_date FROM requests WHERE status IN ('Issued', 'Received') AND request_date::date = CURRENT_DATE ORDER BY request_date DESC""")
         if today_log.empty: st.info("Nothing issued today yet.")
-        else: st.dataframe(today_log, width="stretch")
+        else: perf.widget(st.dataframe)(today_log, width="stretch")
 
     elif view_option == "NSTC Stock Take":
         render_bulk_stock_take("NSTC", st.session_state.user_info['name'], "sk")
@@ -370,6 +363,7 @@ def storekeeper_view():
 # ============ SUPERVISOR VIEW (WH) ========
 # ==========================================
 @st.fragment
+@perf.timed_render
 def supervisor_view_warehouse():
     user = st.session_state.user_info
     # Handle multiple regions
@@ -386,20 +380,23 @@ def supervisor_view_warehouse():
         
         inv = get_inventory("NSTC")
         if not inv.empty:
-            inv_df = inv[['name_en', 'category', 'unit']].copy() 
-            inv_df.rename(columns={'name_en': 'Item Name'}, inplace=True)
+            inv_df = inv[['item_id', 'name_en', 'category', 'unit', 'available']].copy() 
+            inv_df.rename(columns={'name_en': 'Item Name', 'available': 'Available'}, inplace=True)
             inv_df['Order Qty'] = 0 
             st.info(f"Ordering for: {selected_region_wh}")
             
             @st.fragment
+            @perf.timed_render
             def render_supervisor_order_form(inv_df):
                 with st.form(key=f"order_form_{selected_region_wh}"):
-                    edited_order = st.data_editor(
+                    edited_order = perf.widget(st.data_editor)(
                         inv_df, key=f"order_editor_{selected_region_wh}",
                         column_config={
+                            "item_id": None,
                             "Item Name": st.column_config.TextColumn(disabled=True),
                             "category": st.column_config.TextColumn(disabled=True),
                             "unit": st.column_config.TextColumn(disabled=True),
+                            "Available": st.column_config.NumberColumn(disabled=True, help="NSTC stock not yet reserved for approved requests"),
                             "Order Qty": st.column_config.NumberColumn(min_value=0, max_value=1000, step=1)
                         },
                         hide_index=True, width="stretch", height=400
@@ -411,8 +408,8 @@ def supervisor_view_warehouse():
                             batch_cmds = []
                             for index, row in items_to_order.iterrows():
                                 batch_cmds.append((
-                                    "INSERT INTO requests (supervisor_name, region, item_name, category, qty, unit, status, request_date) VALUES (:s, :r, :i, :c, :q, :u, 'Pending', NOW())",
-                                    {"s": user['name'], "r": selected_region_wh, "i": row['Item Name'], "c": row['category'], "q": int(row['Order Qty']), "u": row['unit']}
+                                    "INSERT INTO requests (supervisor_name, region, item_id, item_name, category, qty, unit, status, request_date) VALUES (:s, :r, :iid, :i, :c, :q, :u, 'Pending', NOW())",
+                                    {"s": user['name'], "r": selected_region_wh, "iid": int(row['item_id']), "i": row['Item Name'], "c": row['category'], "q": int(row['Order Qty']), "u": row['unit']}
                                 ))
                             
                             if run_batch_action(batch_cmds):
@@ -421,29 +418,31 @@ def supervisor_view_warehouse():
 
     elif view_option == "🚚 Ready for Pickup": # Ready for Pickup
         # Filter by region as well
-        ready = run_query("SELECT req_id, item_name, qty, unit, notes FROM requests WHERE supervisor_name=:s AND status='Issued' AND region=:r", {"s": user['name'], "r": selected_region_wh})
+        ready = run_query("SELECT req_id, item_id, item_name, qty, unit, notes FROM requests WHERE supervisor_name=:s AND status='Issued' AND region=:r", {"s": user['name'], "r": selected_region_wh})
         if ready.empty: st.info(f"No items ready for pickup in {selected_region_wh}.")
         else:
              # Just show the list for this region
             pickup_all = st.checkbox(f"Select All ({selected_region_wh})", key=f"pickup_all_{selected_region_wh}")
-            ready_df = ready[['req_id', 'item_name', 'qty', 'unit', 'notes']].copy()
+            ready_df = ready[['req_id', 'item_id', 'item_name', 'qty', 'unit', 'notes']].copy()
             ready_df['Confirm'] = pickup_all
             
             @st.fragment
+            @perf.timed_render
             def render_supervisor_pickup_form(ready_df):
                 with st.form(key=f"rec_form_{selected_region_wh}"):
-                    edited_ready = st.data_editor(
+                    edited_ready = perf.widget(st.data_editor)(
                         ready_df,
                         key=f"ready_editor_{selected_region_wh}",
                         column_config={
-                            "req_id": None, "item_name": st.column_config.TextColumn(disabled=True),
+                            "req_id": None, "item_id": None, "item_name": st.column_config.TextColumn(disabled=True),
                             "Confirm": st.column_config.CheckboxColumn("Received?", default=False)
                         },
                         hide_index=True, width="stretch"
                     )
                     
                     if st.form_submit_button(f"Confirm Receipt for {selected_region_wh}"):
-                        batch_cmds = []
+                        req_updates = []
+                        local_upserts = []
                         rec_count = 0
                         
                         for index, row in edited_ready.iterrows():
@@ -453,21 +452,24 @@ def supervisor_view_warehouse():
                                 qty = int(row['qty'])
                                 
                                 # 1. Update Request
-                                batch_cmds.append(("UPDATE requests SET status='Received' WHERE req_id=:id", {"id":rid}))
+                                req_updates.append({"id":rid})
                                 
                                 # 2. Upsert Local Inventory
-                                upsert_sql = """
-                                INSERT INTO local_inventory (region, item_name, qty, last_updated, updated_by) 
-                                VALUES (:r, :i, :q, NOW(), :u)
-                                ON CONFLICT (region, item_name) 
-                                DO UPDATE SET qty = local_inventory.qty + :q, last_updated=NOW(), updated_by=:u;
-                                """
-                                batch_cmds.append((upsert_sql, {"r":selected_region_wh, "i":item, "q":qty, "u":user['name']}))
+                                local_upserts.append({"r":selected_region_wh, "iid":int(row['item_id']), "i":item, "q":qty, "u":user['name']})
                                 
                                 rec_count += 1
                                 
                         if rec_count > 0:
-                             if run_batch_action(batch_cmds):
+                             upsert_sql = """
+                             INSERT INTO local_inventory (region, item_id, item_name, qty, last_updated, updated_by) 
+                             VALUES (:r, :iid, :i, :q, NOW(), :u)
+                             ON CONFLICT (region, item_id) 
+                             DO UPDATE SET qty = local_inventory.qty + :q, last_updated=NOW(), updated_by=:u;
+                             """
+                             if run_bulk_action([
+                                 ("UPDATE requests SET status='Received' WHERE req_id=:id", req_updates),
+                                 (upsert_sql, local_upserts),
+                             ]):
                                 st.balloons(); st.success(f"Received {rec_count} items."); time.sleep(1); st.rerun()
                              else: st.error("Failed to process receipt.")
             render_supervisor_pickup_form(ready_df)
@@ -485,9 +487,10 @@ def supervisor_view_warehouse():
             else: pending_df['Action'] = "Keep"
             
             @st.fragment
+            @perf.timed_render
             def render_supervisor_pending_edit(pending_df):
                 with st.form(key=f"pending_form_{selected_region_wh}"):
-                    edited_pending = st.data_editor(
+                    edited_pending = perf.widget(st.data_editor)(
                         pending_df,
                         key=f"sup_pending_edit_{selected_region_wh}",
                         column_config={
@@ -512,7 +515,8 @@ def supervisor_view_warehouse():
 
     elif view_option == txt['local_inv']: # Local Inventory
         st.info(f"Update Local Inventory for {selected_region_wh}")
-        local_inv = run_query("SELECT item_name, qty FROM local_inventory WHERE region=:r AND updated_by=:u", {"r":selected_region_wh, "u":user['name']})
+        local_inv = run_query("SELECT l.item_id, i.name_en AS item_name, l.qty FROM local_inventory l JOIN items i ON i.id = l.item_id WHERE l.region=:r AND l.updated_by=:u",
+                              {"r":selected_region_wh, "u":user['name']})
         
         if local_inv.empty:
             st.warning(f"No inventory record found for {selected_region_wh}.")
@@ -522,13 +526,14 @@ def supervisor_view_warehouse():
             local_inv_df['Physical Count'] = local_inv_df['System Count']
             
             @st.fragment
+            @perf.timed_render
             def render_supervisor_local_inventory(local_inv_df):
                 with st.form(key=f"stock_form_{selected_region_wh}"):
-                    edited_local = st.data_editor(
+                    edited_local = perf.widget(st.data_editor)(
                         local_inv_df,
                         key=f"sup_stock_take_{selected_region_wh}",
                         column_config={
-                            "Item Name": st.column_config.TextColumn(disabled=True),
+                            "item_id": None, "Item Name": st.column_config.TextColumn(disabled=True),
                             "System Count": st.column_config.NumberColumn(disabled=True),
                             "Physical Count": st.column_config.NumberColumn(min_value=0, max_value=10000, required=True)
                         },
@@ -536,13 +541,16 @@ def supervisor_view_warehouse():
                     )
                     
                     if st.form_submit_button(f"Update {selected_region_wh} Counts"):
-                        up_count = 0
+                        up_count, failed = 0, []
                         for index, row in edited_local.iterrows():
                             sys = int(row['System Count'])
                             phy = int(row['Physical Count'])
                             if sys != phy:
-                                update_local_inventory(selected_region_wh, row['Item Name'], phy, user['name'])
-                                up_count += 1
-                        if up_count > 0: st.success(f"Updated {up_count} items."); time.sleep(1); st.rerun()
-                        else: st.info("No changes made.")
+                                ok, msg = update_local_inventory(selected_region_wh, int(row['item_id']), phy, user['name'])
+                                if ok: up_count += 1
+                                else: failed.append(f"{row['Item Name']}: {msg}")
+                        if failed: st.error("Not updated: " + "; ".join(failed))
+                        if up_count > 0 and not failed: st.success(f"Updated {up_count} items."); time.sleep(1); st.rerun()
+                        elif up_count > 0: st.success(f"Updated {up_count} items.")
+                        elif not failed: st.info("No changes made.")
             render_supervisor_local_inventory(local_inv_df)
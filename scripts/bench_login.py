@@ -0,0 +1,60 @@
+"""
+Login latency benchmark: bcrypt work per successful login.
+
+Compares the previous login path (checkpw + two hashpw calls on every login) with the
+fast path (checkpw only, rehash only when needs_rehash() says so), sequentially and for a
+burst of simultaneous logins such as a shift change. CPU only, no database needed:
+    python scripts/bench_login.py [rounds ...]
+"""
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the project root to the path so we can import modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import bcrypt
+from modules.auth import DEFAULT_BCRYPT_ROUNDS, verify_password, needs_rehash
+
+PASSWORD = "shift-change-42"
+LOGINS = 20
+CONCURRENT_USERS = 40
+
+def legacy_login(stored, rounds):
+    ok = verify_password(stored, PASSWORD)
+    if ok and stored != bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(rounds)).decode():
+        bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(rounds))
+    return ok
+
+def fast_login(stored, rounds):
+    ok = verify_password(stored, PASSWORD)
+    if ok and needs_rehash(stored):
+        bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(rounds))
+    return ok
+
+def timed(fn, stored, rounds):
+    start = time.perf_counter()
+    fn(stored, rounds)
+    return (time.perf_counter() - start) * 1000
+
+def bench(rounds):
+    stored = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(rounds)).decode()
+    for name, fn in (("previous", legacy_login), ("fast path", fast_login)):
+        samples = [timed(fn, stored, rounds) for _ in range(LOGINS)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(os.cpu_count()) as pool:
+            burst = list(pool.map(lambda _: timed(fn, stored, rounds), range(CONCURRENT_USERS)))
+        wall = time.perf_counter() - start
+        print(f"cost {rounds:>2} {name:>9}: p50 {statistics.median(samples):7.1f} ms, "
+              f"{CONCURRENT_USERS} simultaneous logins done in {wall * 1000:7.0f} ms (slowest login {max(burst):.0f} ms)")
+
+def main():
+    # needs_rehash() compares against the configured cost (DEFAULT_BCRYPT_ROUNDS without secrets),
+    # so hashes below it show the one-off upgrade cost on every iteration here
+    for rounds in [int(r) for r in sys.argv[1:]] or [DEFAULT_BCRYPT_ROUNDS]:
+        bench(rounds)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Run from anywhere: make the project root importable as it is for `streamlit run app.py`
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -0,0 +1,62 @@
+import threading
+
+import pandas as pd
+import pytest
+
+from modules import auth
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(auth, "_pool", None)
+    monkeypatch.setattr(auth, "_pending", 0)
+    monkeypatch.setattr(auth, "POOL_STATS", {k: 0 for k in auth.POOL_STATS})
+    monkeypatch.setattr(auth, "_failures", {})
+    monkeypatch.setattr(auth, "_auth_settings", lambda: {"queue_limit": 1, "hash_workers": 1})
+    yield
+
+def test_password_job_returns_result():
+    assert auth.run_password_job("add", lambda a, b: a + b, 2, 3) == (True, 5)
+    assert auth.pool_stats()["depth"] == 0
+    assert auth.pool_stats()["completed"] == 1
+
+def test_timed_out_job_keeps_its_slot_until_it_finishes(monkeypatch):
+    monkeypatch.setattr(auth, "HASH_TIMEOUT_SECONDS", 0.05)
+    release = threading.Event()
+    assert auth.run_password_job("slow", release.wait, 5) == (False, None)
+    # The caller gave up, but the job is still running on the pool: the queue is still full
+    stats = auth.pool_stats()
+    assert stats["depth"] == 1 and stats["timed_out"] == 1
+    assert auth.run_password_job("next", lambda: 1) == (False, None)
+    assert auth.pool_stats()["rejected"] == 1
+    release.set()
+    auth._get_pool().submit(lambda: None).result(timeout=5)  # single worker: runs after the slow job
+    assert auth.pool_stats()["depth"] == 0
+    assert auth.run_password_job("next", lambda: 1) == (True, 1)
+
+def test_saturated_pool_makes_login_busy_not_wrong(monkeypatch):
+    monkeypatch.setattr(auth, "run_query", lambda *a, **k: pd.DataFrame([{"password": "x", "shift_name": None}]))
+    monkeypatch.setattr(auth, "_pending", 1)
+    with pytest.raises(auth.ServerBusy):
+        auth.login_user("alice", "secret")
+    # Not counted as a failed attempt
+    assert auth.login_throttle_remaining("alice") == 0
+
+def test_username_locked_after_max_failures():
+    for _ in range(auth.MAX_FAILED_ATTEMPTS - 1):
+        auth._record_login_result("Alice", None, False)
+    assert auth.login_throttle_remaining("alice") == 0
+    auth._record_login_result("Alice", None, False)
+    assert auth.login_throttle_remaining("alice") > 0
+    assert auth.throttled_count() == 1
+
+def test_success_clears_username_but_not_address():
+    for _ in range(auth.MAX_FAILED_ATTEMPTS_PER_IP):
+        auth._record_login_result(f"user{_ % 3}", "10.0.0.1", False)
+    auth._record_login_result("user0", "10.0.0.1", True)
+    assert auth.login_throttle_remaining("someone else", "10.0.0.1") > 0
+    assert auth.login_throttle_remaining("someone else", "10.0.0.2") == 0
+
+def test_address_limit_is_higher_than_username_limit():
+    for i in range(auth.MAX_FAILED_ATTEMPTS_PER_IP - 1):
+        auth._record_login_result(f"user{i}", "10.0.0.1", False)
+    assert auth.login_throttle_remaining("new user", "10.0.0.1") == 0
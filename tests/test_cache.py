@@ -0,0 +1,77 @@
+import pytest
+
+from modules import cache
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+def test_tables_read_from_joins_and_subqueries():
+    q = """SELECT l.qty FROM local_inventory l JOIN items i ON i.id = l.item_id
+           WHERE l.region = :r AND l.item_id IN (SELECT item_id FROM public.requests)"""
+    assert cache.tables_read(q) == {"local_inventory", "items", "requests"}
+
+def test_tables_read_resolves_views_and_skips_functions():
+    q = "SELECT * FROM stock_availability a JOIN unnest(CAST(:ids AS integer[])) AS l(id) ON true"
+    assert cache.tables_read(q) == {"inventory", "stock_reservations"}
+
+def test_tables_written():
+    assert cache.tables_written("UPDATE requests SET status = 'Approved' WHERE req_id = :id") == {"requests"}
+    upsert = """INSERT INTO local_inventory (region, item_id, qty) SELECT :r, id, :q FROM items WHERE id = :iid
+                ON CONFLICT (region, item_id) DO UPDATE SET qty = EXCLUDED.qty"""
+    assert cache.tables_written(upsert) == {"local_inventory"}
+    cte = """WITH moved AS (UPDATE inventory SET qty = qty + :chg RETURNING item_id, qty)
+             INSERT INTO stock_logs (item_id, new_qty) SELECT item_id, qty FROM moved"""
+    assert cache.tables_written(cte) == {"inventory", "stock_logs"}
+    assert cache.tables_written("SELECT 1") == frozenset()
+
+def test_invalidate_drops_only_readers_of_written_tables():
+    shifts = cache.make_key("SELECT * FROM shifts", None)
+    reqs = cache.make_key("SELECT * FROM requests WHERE region = :r", {"r": "North"})
+    cache.put(shifts, "shifts", cache.tables_read("SELECT * FROM shifts"), ttl=60)
+    cache.put(reqs, "reqs", cache.tables_read("SELECT * FROM requests"), ttl=60)
+    cache.invalidate(cache.tables_written("DELETE FROM requests WHERE req_id = 1"))
+    assert cache.get(reqs) is None
+    assert cache.get(shifts) == "shifts"
+
+@pytest.mark.parametrize("written, read", [
+    ("requests", "stock_reservations"),
+    ("inventory", "items"),
+    ("inventory", "inventory_tombstones"),
+])
+def test_invalidate_follows_trigger_writes(written, read):
+    key = cache.make_key(f"SELECT * FROM {read}", None)
+    cache.put(key, "cached", cache.tables_read(f"SELECT * FROM {read}"), ttl=60)
+    cache.invalidate({written})
+    assert cache.get(key) is None
+
+def test_view_reads_invalidated_by_base_table_writes():
+    q = "SELECT * FROM stock_availability WHERE location = :loc"
+    key = cache.make_key(q, {"loc": "NSTC"})
+    cache.put(key, "cached", cache.tables_read(q), ttl=60)
+    cache.invalidate({"stock_reservations"})
+    assert cache.get(key) is None
+
+def test_result_read_before_a_write_is_not_stored():
+    tables = frozenset({"inventory"})
+    version = cache.table_version(*tables)
+    cache.invalidate(tables)  # a write lands while the read is running
+    key = cache.make_key("SELECT * FROM inventory", None)
+    cache.put(key, "stale", tables, ttl=60, version=version)
+    assert cache.get(key) is None
+
+def test_table_version_changes_on_write_and_clear():
+    before = cache.table_version("requests")
+    cache.invalidate({"attendance"})
+    assert cache.table_version("requests") == before
+    cache.invalidate({"requests"})
+    after = cache.table_version("requests")
+    assert after != before
+    cache.clear()
+    assert cache.table_version("requests") != after
+
+def test_make_key_ignores_param_order():
+    assert cache.make_key("q", {"a": 1, "b": 2}) == cache.make_key("q", {"b": 2, "a": 1})
+    assert cache.make_key("q", {"a": 1}) != cache.make_key("q", {"a": "1"})
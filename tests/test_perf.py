@@ -0,0 +1,22 @@
+from modules import perf
+
+def test_fingerprint_replaces_literals():
+    assert perf.fingerprint("SELECT * FROM requests WHERE req_id = 42 AND status = 'Approved'") == \
+        "SELECT * FROM requests WHERE req_id = ? AND status = ?"
+
+def test_fingerprint_handles_escaped_quotes_and_decimals():
+    assert perf.fingerprint("UPDATE inventory SET name_en = 'O''Brien tape', qty = 2.5") == "UPDATE inventory SET name_en = ?, qty = ?"
+
+def test_fingerprint_keeps_identifiers_and_placeholders():
+    assert perf.fingerprint("SELECT t1.qty FROM inventory t1 WHERE t1.item_id = :iid") == "SELECT t1.qty FROM inventory t1 WHERE t1.item_id = :iid"
+
+def test_fingerprint_collapses_whitespace():
+    q = """
+        SELECT req_id
+        FROM   requests
+        WHERE  region = 'North'
+    """
+    assert perf.fingerprint(q) == "SELECT req_id FROM requests WHERE region = ?"
+
+def test_same_statement_with_different_literals_shares_a_fingerprint():
+    assert perf.fingerprint("DELETE FROM requests WHERE req_id = 1") == perf.fingerprint("DELETE FROM requests WHERE req_id = 977")
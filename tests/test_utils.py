@@ -0,0 +1,43 @@
+import io
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, text
+
+from modules.utils import export_query
+
+ROWS = 12
+
+@pytest.fixture
+def engine():
+    # A NULL-only first chunk: user_name and qty are empty for the first 5 rows (like early stock_logs.user_name)
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE logs (id INTEGER, user_name TEXT, qty INTEGER)"))
+        conn.execute(text("INSERT INTO logs VALUES (:i, :u, :q)"),
+                     [{"i": i, "u": None if i < 5 else f"user {i}", "q": None if i < 5 else i} for i in range(ROWS)])
+    return engine
+
+QUERY = "SELECT id, user_name, qty FROM logs ORDER BY id"
+
+def test_csv_export_streams_all_chunks(engine):
+    df = pd.read_csv(io.BytesIO(export_query(engine, QUERY, fmt="csv", chunksize=5)))
+    assert list(df.columns) == ["id", "user_name", "qty"]
+    assert df["id"].tolist() == list(range(ROWS))
+    assert df["user_name"].iloc[-1] == f"user {ROWS - 1}"
+
+def test_xlsx_export_streams_all_chunks(engine):
+    df = pd.read_excel(io.BytesIO(export_query(engine, QUERY, fmt="xlsx", sheet_name="Logs", chunksize=5)), sheet_name="Logs")
+    assert len(df) == ROWS
+    assert df["user_name"].isna().sum() == 5
+
+def test_parquet_export_with_null_first_chunk(engine):
+    pytest.importorskip("pyarrow")
+    df = pd.read_parquet(io.BytesIO(export_query(engine, QUERY, fmt="parquet", chunksize=5)))
+    assert len(df) == ROWS
+    assert df["user_name"].isna().sum() == 5
+    assert df["user_name"].iloc[-1] == f"user {ROWS - 1}"
+
+def test_unknown_format_rejected(engine):
+    with pytest.raises(ValueError):
+        export_query(engine, QUERY, fmt="docx")